@@ -1,6 +1,9 @@
 from flask import Flask
 from app.config import load_configurations, configure_logging
 from .views import webhook_blueprint
+from .services.journal import start_journal
+from .utils.whatsapp_utils import process_whatsapp_message
+from .utils.profiling import install_profile_signal
 
 
 def create_app():
@@ -13,4 +16,10 @@ def create_app():
     # Import and register blueprints, if any
     app.register_blueprint(webhook_blueprint)
 
+    # Replay messages a previous worker accepted but never answered
+    start_journal(app, process_whatsapp_message)
+
+    # kill -USR2 <pid> writes a sampling profile of this worker
+    install_profile_signal()
+
     return app
@@ -2,6 +2,7 @@ import sys
 import os
 from dotenv import load_dotenv
 import logging
+from app.tenants import load_tenants
 
 
 def load_configurations(app):
@@ -14,6 +15,11 @@ def load_configurations(app):
     app.config["VERSION"] = os.getenv("VERSION")
     app.config["PHONE_NUMBER_ID"] = os.getenv("PHONE_NUMBER_ID")
     app.config["VERIFY_TOKEN"] = os.getenv("VERIFY_TOKEN")
+    app.config["ADMIN_TOKEN"] = os.getenv("ADMIN_TOKEN")
+    app.config["TENANTS_FILE"] = os.getenv("TENANTS_FILE")
+
+    # Route each phone number to its own credentials and assistant
+    load_tenants(app.config)
 
 
 def configure_logging():
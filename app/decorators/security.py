@@ -3,15 +3,20 @@ from flask import current_app, jsonify, request
 import logging
 import hashlib
 import hmac
+from app.tenants import phone_number_id_for_body, tenant_for_body
 
 
-def validate_signature(payload, signature):
+def validate_signature(payload, signature, app_secret=None):
     """
     Validate the incoming payload's signature against our expected signature
     """
+    app_secret = app_secret or current_app.config.get("APP_SECRET")
+    if not app_secret:
+        return False
+
     # Use the App Secret to hash the payload
     expected_signature = hmac.new(
-        bytes(current_app.config["APP_SECRET"], "latin-1"),
+        bytes(app_secret, "latin-1"),
         msg=payload.encode("utf-8"),
         digestmod=hashlib.sha256,
     ).hexdigest()
@@ -30,9 +35,34 @@ def signature_required(f):
         signature = request.headers.get("X-Hub-Signature-256", "")[
             7:
         ]  # Removing 'sha256='
-        if not validate_signature(request.data.decode("utf-8"), signature):
+        # Each tenant's app has its own secret; route before verifying
+        body = request.get_json(silent=True) or {}
+        tenant = tenant_for_body(body)
+        if tenant is None:
+            logging.warning(
+                f"Rejecting webhook for unknown phone number {phone_number_id_for_body(body)}"
+            )
+            return jsonify({"status": "error", "message": "Unknown phone number"}), 403
+        if not validate_signature(request.data.decode("utf-8"), signature, tenant.app_secret):
             logging.info("Signature verification failed!")
             return jsonify({"status": "error", "message": "Invalid signature"}), 403
         return f(*args, **kwargs)
 
     return decorated_function
+
+
+def admin_required(f):
+    """
+    Decorator to restrict admin endpoints to callers presenting the ADMIN_TOKEN as a bearer token.
+    """
+
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        admin_token = current_app.config.get("ADMIN_TOKEN")
+        provided = request.headers.get("Authorization", "")[7:]  # Removing 'Bearer '
+        if not admin_token or not hmac.compare_digest(admin_token, provided):
+            logging.info("Admin authentication failed!")
+            return jsonify({"status": "error", "message": "Unauthorized"}), 401
+        return f(*args, **kwargs)
+
+    return decorated_function
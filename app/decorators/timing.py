@@ -0,0 +1,33 @@
+from functools import wraps
+from flask import make_response
+import logging
+import os
+import time
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Read once at import: when disabled the decorator returns the view untouched
+REQUEST_TIMING = os.getenv("REQUEST_TIMING", "false").lower() in ("1", "true", "yes")
+
+
+def request_timing(f):
+    """
+    Decorator recording a view's wall and CPU time in the log and a Server-Timing header.
+    """
+    if not REQUEST_TIMING:
+        return f
+
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        response = make_response(f(*args, **kwargs))
+        wall_ms = (time.perf_counter() - wall_start) * 1000
+        cpu_ms = (time.thread_time() - cpu_start) * 1000
+        response.headers["Server-Timing"] = f"wall;dur={wall_ms:.1f}, cpu;dur={cpu_ms:.1f}"
+        logging.info(f"{f.__name__}: wall {wall_ms:.1f}ms, cpu {cpu_ms:.1f}ms")
+        return response
+
+    return decorated_function
@@ -0,0 +1,307 @@
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Admission settings
+MAX_CONCURRENT_RUNS = int(os.getenv("MAX_CONCURRENT_RUNS", "8"))
+MAX_QUEUED_RUNS = int(os.getenv("MAX_QUEUED_RUNS", "32"))
+QUEUE_TIMEOUT_SECONDS = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "5"))
+OPENAI_TOKENS_PER_MINUTE = int(os.getenv("OPENAI_TOKENS_PER_MINUTE", "300000"))
+ESTIMATED_TOKENS_PER_RUN = int(os.getenv("ESTIMATED_TOKENS_PER_RUN", "2000"))
+# Well above a person splitting one question over several quick messages
+SENDER_MESSAGES_PER_MINUTE = int(os.getenv("SENDER_MESSAGES_PER_MINUTE", "20"))
+SENDER_BURST = int(os.getenv("SENDER_BURST", "10"))
+# A rate-limited sender is told so at most once per window
+SENDER_NOTICE_SECONDS = 60
+
+# Tokens held back from the budget by the run admitted in this context
+_reservation = ContextVar("token_reservation", default=None)
+
+OVERLOAD_REPLY = (
+    "Thanks for your message! We're receiving a lot of requests right now, "
+    "we'll get back to you shortly."
+)
+
+SENDER_RATE_REPLY = (
+    "You're sending messages faster than we can answer them. "
+    "Please wait a minute and send your question again."
+)
+
+
+class AdmissionRejected(Exception):
+    """
+    Raised when a request is shed instead of being admitted
+    """
+
+    def __init__(self, reason, notify=True):
+        super().__init__(reason)
+        self.reason = reason
+        # False when the sender has already been told in this window
+        self.notify = notify
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled continuously at a fixed rate
+    """
+
+    def __init__(self, capacity, refill_per_second):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated) * self.refill_per_second
+        )
+        self.updated = now
+
+    def try_acquire(self, amount=1):
+        """
+        Take tokens from the bucket if enough are available
+
+        :param amount: Number of tokens to take
+        :return: True if the tokens were taken
+        """
+        with self.lock:
+            self._refill()
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return True
+            return False
+
+    def consume(self, amount):
+        """
+        Debit tokens unconditionally; the bucket may go into debt
+
+        :param amount: Number of tokens to debit
+        """
+        with self.lock:
+            self._refill()
+            self.tokens -= amount
+
+    def level(self):
+        with self.lock:
+            self._refill()
+            return self.tokens
+
+
+class AdmissionController:
+    """
+    Gatekeeper in front of assistant runs.
+
+    Requests pass a per-sender rate limit, then reserve their estimated cost
+    from the OpenAI token budget, then wait (bounded) for one of their tenant's
+    slots and one of the shared run slots. The reservation is settled against
+    the run's actual usage in record_usage. Anything that cannot be admitted
+    raises AdmissionRejected so the caller can send a fast reply.
+    """
+
+    def __init__(
+        self,
+        max_concurrent=MAX_CONCURRENT_RUNS,
+        max_queued=MAX_QUEUED_RUNS,
+        queue_timeout=QUEUE_TIMEOUT_SECONDS,
+        tokens_per_minute=OPENAI_TOKENS_PER_MINUTE,
+        estimated_tokens=ESTIMATED_TOKENS_PER_RUN,
+        sender_per_minute=SENDER_MESSAGES_PER_MINUTE,
+        sender_burst=SENDER_BURST,
+    ):
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.slots = threading.BoundedSemaphore(max_concurrent)
+        self.token_bucket = TokenBucket(tokens_per_minute, tokens_per_minute / 60.0)
+        self.estimated_tokens = float(estimated_tokens)
+        self.sender_per_minute = sender_per_minute
+        self.sender_burst = sender_burst
+        self.sender_buckets = {}
+        self.sender_notices = {}
+        self.lock = threading.Lock()
+        self.active = 0
+        self.waiting = 0
+        self.counters = {
+            "admitted": 0,
+            "queued": 0,
+            "shed_sender_rate": 0,
+            "shed_token_budget": 0,
+            "shed_queue_full": 0,
+            "shed_queue_timeout": 0,
+            "shed_tenant_busy": 0,
+        }
+        self.tenant_in_flight = {}
+
+    def _sender_bucket(self, wa_id):
+        with self.lock:
+            bucket = self.sender_buckets.get(wa_id)
+            if bucket is None:
+                if len(self.sender_buckets) > 10000:
+                    self._prune_sender_buckets()
+                bucket = TokenBucket(self.sender_burst, self.sender_per_minute / 60.0)
+                self.sender_buckets[wa_id] = bucket
+            return bucket
+
+    def _prune_sender_buckets(self):
+        # Full buckets carry no state worth keeping
+        for wa_id, bucket in list(self.sender_buckets.items()):
+            if bucket.level() >= bucket.capacity:
+                del self.sender_buckets[wa_id]
+        cutoff = time.monotonic() - SENDER_NOTICE_SECONDS
+        for wa_id, noticed in list(self.sender_notices.items()):
+            if noticed < cutoff:
+                del self.sender_notices[wa_id]
+
+    def _shed(self, reason, notify=True):
+        with self.lock:
+            self.counters[f"shed_{reason}"] += 1
+        logging.warning(f"Admission rejected: {reason}")
+        raise AdmissionRejected(reason, notify)
+
+    def _first_notice(self, sender_key):
+        now = time.monotonic()
+        with self.lock:
+            noticed = self.sender_notices.get(sender_key)
+            if noticed is not None and now - noticed < SENDER_NOTICE_SECONDS:
+                return False
+            self.sender_notices[sender_key] = now
+            return True
+
+    def check_sender(self, wa_id, tenant=None):
+        """
+        Apply the per-sender rate limit on its own, before any other work for the message
+
+        :param wa_id: WhatsApp ID of the sender
+        :param tenant: Optional tenant the sender wrote to
+        :raises AdmissionRejected: If the sender is over their rate; notify is
+            True only for the first rejection in SENDER_NOTICE_SECONDS
+        """
+        sender_key = f"{tenant.name}:{wa_id}" if tenant else wa_id
+        if not self._sender_bucket(sender_key).try_acquire():
+            self._shed("sender_rate", notify=self._first_notice(sender_key))
+
+    @contextmanager
+    def admit(self, wa_id, tenant=None, check_sender=True):
+        """
+        Hold a run slot for the duration of the block
+
+        :param wa_id: WhatsApp ID of the sender
+        :param tenant: Optional tenant whose own concurrency limit also applies
+        :param check_sender: False if check_sender() was already called for this message
+        :raises AdmissionRejected: If the request is shed
+        """
+        if check_sender:
+            self.check_sender(wa_id, tenant)
+
+        reservation = {"tokens": self.estimated_tokens, "settled": False}
+        if not self.token_bucket.try_acquire(reservation["tokens"]):
+            self._shed("token_budget")
+
+        try:
+            # A busy tenant waits on its own slots without holding shared ones
+            if tenant is not None:
+                if not tenant.slots.acquire(timeout=self.queue_timeout):
+                    self._shed("tenant_busy")
+                with self.lock:
+                    self.tenant_in_flight[tenant.name] = self.tenant_in_flight.get(tenant.name, 0) + 1
+            try:
+                with self._global_slot():
+                    token = _reservation.set(reservation)
+                    try:
+                        yield
+                    finally:
+                        _reservation.reset(token)
+            finally:
+                if tenant is not None:
+                    with self.lock:
+                        self.tenant_in_flight[tenant.name] -= 1
+                    tenant.slots.release()
+        except AdmissionRejected:
+            # Never ran, so give the reservation back
+            self.token_bucket.consume(-reservation["tokens"])
+            raise
+
+    @contextmanager
+    def _global_slot(self):
+        if not self.slots.acquire(blocking=False):
+            with self.lock:
+                if self.waiting >= self.max_queued:
+                    full = True
+                else:
+                    full = False
+                    self.waiting += 1
+                    self.counters["queued"] += 1
+            if full:
+                self._shed("queue_full")
+            try:
+                acquired = self.slots.acquire(timeout=self.queue_timeout)
+            finally:
+                with self.lock:
+                    self.waiting -= 1
+            if not acquired:
+                self._shed("queue_timeout")
+            # Runs that finished while we waited may have overspent the budget
+            if self.token_bucket.level() < 0:
+                self.slots.release()
+                self._shed("token_budget")
+
+        with self.lock:
+            self.active += 1
+            self.counters["admitted"] += 1
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.active -= 1
+            self.slots.release()
+
+    def record_usage(self, total_tokens):
+        """
+        Settle a finished run's actual token usage against its reservation
+
+        Called for every run that reports usage, whatever its terminal status.
+        Runs that never report usage keep their reservation.
+
+        :param total_tokens: Prompt plus completion tokens reported by OpenAI
+        """
+        reservation = _reservation.get()
+        if reservation is not None and not reservation["settled"]:
+            reservation["settled"] = True
+            self.token_bucket.consume(total_tokens - reservation["tokens"])
+        else:
+            self.token_bucket.consume(total_tokens)
+        with self.lock:
+            # Exponentially weighted estimate of the cost of the next run
+            self.estimated_tokens = 0.8 * self.estimated_tokens + 0.2 * total_tokens
+
+    def stats(self):
+        """
+        Snapshot of the admission counters
+
+        :return: Dictionary of gauges and counters
+        """
+        with self.lock:
+            stats = dict(self.counters)
+            stats.update(
+                {
+                    "active": self.active,
+                    "waiting": self.waiting,
+                    "max_concurrent": self.max_concurrent,
+                    "estimated_tokens_per_run": round(self.estimated_tokens),
+                    "tenant_in_flight": dict(self.tenant_in_flight),
+                }
+            )
+        stats["token_budget_remaining"] = round(self.token_bucket.level())
+        return stats
+
+
+admission = AdmissionController()
@@ -0,0 +1,323 @@
+import os
+import sys
+import csv
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+import aiohttp
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+ACCESS_TOKEN = os.getenv("ACCESS_TOKEN")
+PHONE_NUMBER_ID = os.getenv("PHONE_NUMBER_ID")
+VERSION = os.getenv("VERSION", "v18.0")
+
+# Cloud API throughput is 80 messages/second by default and can be raised per number
+BROADCAST_MESSAGES_PER_SECOND = float(os.getenv("BROADCAST_MESSAGES_PER_SECOND", "80"))
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "64"))
+BROADCAST_MAX_RETRIES = int(os.getenv("BROADCAST_MAX_RETRIES", "5"))
+CHECKPOINT_EVERY_SECONDS = 2.0
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+def get_template_message_input(recipient, template, language, parameters=None):
+    """
+    Prepare JSON payload for a WhatsApp template message
+
+    :param recipient: Recipient's phone number
+    :param template: Approved template name
+    :param language: Template language code (e.g. "fr")
+    :param parameters: Optional list of body parameter values
+    :return: JSON-formatted message payload
+    """
+    payload = {
+        "messaging_product": "whatsapp",
+        "recipient_type": "individual",
+        "to": recipient,
+        "type": "template",
+        "template": {"name": template, "language": {"code": language}},
+    }
+    if parameters:
+        payload["template"]["components"] = [
+            {
+                "type": "body",
+                "parameters": [{"type": "text", "text": str(value)} for value in parameters],
+            }
+        ]
+    return json.dumps(payload)
+
+
+def read_recipients(path):
+    """
+    Stream recipients from a CSV or JSONL file
+
+    Each record needs a "wa_id" field; an optional "parameters" field (a JSON
+    list in JSONL, a "|"-separated string in CSV) fills the template body.
+
+    :param path: Path to the recipient list
+    :return: Generator of (line number, record); record is None for unparseable lines
+    """
+    with open(path, "r", encoding="utf-8", newline="") as fileobj:
+        if path.endswith(".jsonl"):
+            for line_no, line in enumerate(fileobj):
+                if not line.strip():
+                    continue
+                try:
+                    yield line_no, json.loads(line)
+                except json.JSONDecodeError as e:
+                    logging.error(f"Line {line_no}: invalid JSON: {e}")
+                    yield line_no, None
+        else:
+            for line_no, row in enumerate(csv.DictReader(fileobj)):
+                if row.get("parameters"):
+                    row["parameters"] = row["parameters"].split("|")
+                yield line_no, row
+
+
+def validate_recipient(record):
+    """
+    Check a recipient record before sending to it
+
+    :param record: Record from read_recipients()
+    :return: Error message, or None if the record is valid
+    """
+    if not isinstance(record, dict):
+        return "not a record"
+    wa_id = str(record.get("wa_id") or "").strip().lstrip("+")
+    if not wa_id.isdigit():
+        return f"invalid wa_id {record.get('wa_id')!r}"
+    parameters = record.get("parameters")
+    if parameters is not None and not isinstance(parameters, list):
+        return "parameters must be a list"
+    return None
+
+
+class AsyncTokenBucket:
+    """
+    Token bucket for pacing coroutines to a sustained rate
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class Checkpoint:
+    """
+    Tracks which lines of the recipient list are finished
+
+    Sends complete out of order, so the low-water mark is persisted along with
+    the lines finished above it; on resume, all of them are skipped.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.next_line = 0
+        self.sent = 0
+        self.failed = 0
+        self.done = set()
+        self.saved_at = 0.0
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as fileobj:
+                state = json.load(fileobj)
+            self.next_line = state["next_line"]
+            self.sent = state["sent"]
+            self.failed = state["failed"]
+            self.done = set(state.get("done", []))
+
+    def mark(self, line_no, ok=None):
+        """
+        Record a finished line; ok=None marks a line without a recipient
+        """
+        if ok is True:
+            self.sent += 1
+        elif ok is False:
+            self.failed += 1
+        self.done.add(line_no)
+        while self.next_line in self.done:
+            self.done.remove(self.next_line)
+            self.next_line += 1
+        if time.monotonic() - self.saved_at >= CHECKPOINT_EVERY_SECONDS:
+            self.save()
+
+    def save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fileobj:
+            json.dump(
+                {
+                    "next_line": self.next_line,
+                    "sent": self.sent,
+                    "failed": self.failed,
+                    "done": sorted(self.done),
+                },
+                fileobj,
+            )
+            fileobj.flush()
+            os.fsync(fileobj.fileno())
+        os.replace(tmp_path, self.path)
+        self.saved_at = time.monotonic()
+
+
+async def send_with_retries(
+    session, url, data, recipient, bucket, max_retries=BROADCAST_MAX_RETRIES
+):
+    """
+    Send one message over the shared session, retrying transient failures
+
+    :param session: Shared aiohttp session
+    :param url: Graph messages endpoint
+    :param data: Prepared message data
+    :param recipient: Recipient's phone number (for logging)
+    :param bucket: AsyncTokenBucket every attempt, retries included, is paced by
+    :param max_retries: Number of attempts
+    :return: True if the message was accepted
+    """
+    for attempt in range(1, max_retries + 1):
+        # Retries count against the throughput limit like any other request
+        await bucket.acquire()
+        try:
+            async with session.post(url, data=data) as response:
+                if response.status == 200:
+                    return True
+                body = await response.text()
+                if response.status not in RETRYABLE_STATUSES:
+                    logging.error(f"Broadcast to {recipient} failed ({response.status}): {body}")
+                    return False
+                logging.warning(f"Broadcast to {recipient} got {response.status}, retrying")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logging.warning(f"Broadcast to {recipient} errored: {e!r}, retrying")
+        if attempt < max_retries:
+            await asyncio.sleep(min(30, 2 ** (attempt - 1)) * (0.5 + random.random()))
+    logging.error(f"Giving up on {recipient} after {max_retries} attempts")
+    return False
+
+
+async def broadcast(
+    recipients_path,
+    template,
+    language,
+    rate=BROADCAST_MESSAGES_PER_SECOND,
+    concurrency=BROADCAST_CONCURRENCY,
+):
+    """
+    Send a template message to every recipient in a list, resumably
+
+    :param recipients_path: CSV or JSONL recipient list
+    :param template: Approved template name
+    :param language: Template language code
+    :param rate: Sustained messages per second
+    :param concurrency: Maximum in-flight requests
+    :return: Broadcast report
+    """
+    url = f"https://graph.facebook.com/{VERSION}/{PHONE_NUMBER_ID}/messages"
+    headers = {
+        "Content-type": "application/json",
+        "Authorization": f"Bearer {ACCESS_TOKEN}",
+    }
+    checkpoint = Checkpoint(f"{recipients_path}.checkpoint")
+    resume_from = checkpoint.next_line
+    if resume_from:
+        logging.info(f"Resuming broadcast from line {resume_from}")
+    bucket = AsyncTokenBucket(rate)
+    queue = asyncio.Queue(maxsize=concurrency * 2)
+    sent_this_run = 0
+
+    async def worker(session):
+        nonlocal sent_this_run
+        while True:
+            item = await queue.get()
+            if item is None:
+                queue.task_done()
+                return
+            line_no, record = item
+            ok = False
+            try:
+                error = validate_recipient(record)
+                if error:
+                    logging.error(f"Line {line_no}: skipping recipient: {error}")
+                else:
+                    data = get_template_message_input(
+                        record["wa_id"], template, language, record.get("parameters")
+                    )
+                    ok = await send_with_retries(session, url, data, record["wa_id"], bucket)
+            except Exception as e:
+                # One bad row must not take a worker down with it
+                logging.error(f"Line {line_no}: broadcast failed: {e!r}")
+            sent_this_run += ok
+            checkpoint.mark(line_no, ok)
+            queue.task_done()
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    timeout = aiohttp.ClientTimeout(total=30)
+    start = time.perf_counter()
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout, headers=headers) as session:
+        workers = [asyncio.create_task(worker(session)) for _ in range(concurrency)]
+        try:
+            expected = resume_from
+            for line_no, record in read_recipients(recipients_path):
+                if line_no < resume_from:
+                    continue
+                # Blank lines produce no record but must not stall the checkpoint
+                for gap in range(expected, line_no):
+                    checkpoint.mark(gap)
+                expected = line_no + 1
+                if line_no in checkpoint.done:
+                    # Finished out of order before the restart
+                    continue
+                await queue.put((line_no, record))
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            checkpoint.save()
+    elapsed = time.perf_counter() - start
+
+    return {
+        "sent": checkpoint.sent,
+        "failed": checkpoint.failed,
+        "sent_this_run": sent_this_run,
+        "elapsed_seconds": round(elapsed, 2),
+        "messages_per_second": round(sent_this_run / max(elapsed, 1e-6), 2),
+        "next_line": checkpoint.next_line,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Broadcast a WhatsApp template to a recipient list")
+    parser.add_argument("recipients", help="CSV or JSONL file with a wa_id field")
+    parser.add_argument("template")
+    parser.add_argument("--language", default="fr")
+    parser.add_argument("--rate", type=float, default=BROADCAST_MESSAGES_PER_SECOND)
+    parser.add_argument("--concurrency", type=int, default=BROADCAST_CONCURRENCY)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s: %(message)s')
+    report = asyncio.run(
+        broadcast(args.recipients, args.template, args.language, args.rate, args.concurrency)
+    )
+    print(json.dumps(report, indent=2))
+    return 1 if report["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
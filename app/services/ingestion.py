@@ -0,0 +1,257 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import logging
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from app.services.openai_service import client, upload_file, OPENAI_ASSISTANT_ID
+
+# Ingestion settings
+KB_MANIFEST_PATH = os.getenv("KB_MANIFEST_PATH", "kb_manifest.json")
+INGEST_MAX_WORKERS = int(os.getenv("INGEST_MAX_WORKERS", "4"))
+INGEST_MAX_RETRIES = int(os.getenv("INGEST_MAX_RETRIES", "3"))
+INGEST_EXTENSIONS = (".pdf", ".docx", ".doc", ".txt", ".md", ".html", ".json", ".pptx")
+
+# Assistants v1 accepts at most this many attached files
+ASSISTANT_MAX_FILES = 20
+
+# Used to estimate time saved before any upload has been timed
+DEFAULT_UPLOAD_BYTES_PER_SECOND = 1024 * 1024
+
+
+def hash_file(path, chunk_size=1024 * 1024):
+    """
+    Hash a file's contents without reading it into memory at once
+
+    :param path: Path to the file
+    :return: Hex SHA-256 digest
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as fileobj:
+        for chunk in iter(lambda: fileobj.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_manifest(path=KB_MANIFEST_PATH):
+    """
+    Load the hash -> uploaded file manifest
+
+    :param path: Manifest path
+    :return: Manifest dictionary
+    """
+    if not os.path.exists(path):
+        return {"files": {}, "upload_bytes_per_second": None}
+    with open(path, "r", encoding="utf-8") as fileobj:
+        return json.load(fileobj)
+
+
+def save_manifest(manifest, path=KB_MANIFEST_PATH):
+    """
+    Atomically write the manifest so an interrupted run never corrupts it
+
+    :param manifest: Manifest dictionary
+    :param path: Manifest path
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as fileobj:
+        json.dump(manifest, fileobj, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def scan_directory(directory):
+    """
+    Walk a directory and hash every supported document in it
+
+    :param directory: Root of the knowledge base
+    :return: Dictionary of hash -> (path, size)
+    """
+    found = {}
+    for root, _, filenames in os.walk(directory):
+        for filename in sorted(filenames):
+            if not filename.lower().endswith(INGEST_EXTENSIONS):
+                continue
+            path = os.path.join(root, filename)
+            found.setdefault(hash_file(path), (path, os.path.getsize(path)))
+    return found
+
+
+def upload_with_retries(path, retries=INGEST_MAX_RETRIES):
+    """
+    Upload a file, retrying with exponential backoff
+
+    :param path: Path to the file
+    :param retries: Number of attempts
+    :return: Uploaded file object, or None if every attempt failed
+    """
+    for attempt in range(1, retries + 1):
+        file = upload_file(path)
+        if file is not None:
+            return file
+        if attempt < retries:
+            delay = 2 ** (attempt - 1)
+            logging.warning(f"Retrying upload of {path} in {delay}s ({attempt}/{retries})")
+            time.sleep(delay)
+    logging.error(f"Giving up on {path} after {retries} attempts")
+    return None
+
+
+def superseded_digests(known, found, failed=()):
+    """
+    Manifest entries whose document is still present but has changed since upload
+
+    Documents whose new version failed to upload are left out; their old
+    version stays in use until a replacement is uploaded.
+
+    :param known: Manifest files (hash -> entry)
+    :param found: Output of scan_directory()
+    :param failed: Paths whose upload failed in this run
+    :return: Hashes of the outdated entries
+    """
+    current_paths = {path for path, _ in found.values()} - set(failed)
+    return [
+        digest for digest, entry in known.items()
+        if digest not in found and entry["path"] in current_paths
+    ]
+
+
+def fallback_digests(known, found, failed):
+    """
+    Manifest entries standing in for changed documents whose new version failed to upload
+
+    :param known: Manifest files (hash -> entry)
+    :param found: Output of scan_directory()
+    :param failed: Paths whose upload failed in this run
+    :return: Hashes of the previous versions to keep attached
+    """
+    failed = set(failed)
+    return [
+        digest for digest, entry in known.items()
+        if digest not in found and entry["path"] in failed
+    ]
+
+
+def delete_superseded(manifest, digests):
+    """
+    Delete outdated uploads from OpenAI storage and drop them from the manifest
+
+    :param manifest: Manifest dictionary
+    :param digests: Hashes returned by superseded_digests()
+    :return: Deleted file IDs
+    """
+    deleted = []
+    for digest in digests:
+        file_id = manifest["files"][digest]["file_id"]
+        try:
+            client.files.delete(file_id)
+        except Exception as e:
+            # Keep the entry so the next run tries again
+            logging.warning(f"Failed to delete superseded file {file_id}: {e}")
+            continue
+        del manifest["files"][digest]
+        deleted.append(file_id)
+        logging.info(f"Deleted superseded file {file_id}")
+    return deleted
+
+
+def ingest_directory(directory, assistant_id=OPENAI_ASSISTANT_ID, max_workers=INGEST_MAX_WORKERS):
+    """
+    Upload new or changed documents and sync the assistant's attachments
+
+    Nothing is uploaded or attached if the directory holds more documents than
+    an assistant accepts.
+
+    :param directory: Root of the knowledge base
+    :param assistant_id: Assistant to attach the files to, or None to skip
+    :param max_workers: Maximum concurrent uploads
+    :return: Ingestion report
+    """
+    manifest = load_manifest()
+    known = manifest["files"]
+    found = scan_directory(directory)
+
+    if assistant_id and len(found) > ASSISTANT_MAX_FILES:
+        error = (
+            f"{directory} holds {len(found)} documents but an assistant accepts at most "
+            f"{ASSISTANT_MAX_FILES}; merge or remove some before ingesting"
+        )
+        logging.error(error)
+        return {"files_found": len(found), "files_failed": [], "error": error}
+
+    pending = {digest: entry for digest, entry in found.items() if digest not in known}
+    skipped_bytes = sum(size for digest, (_, size) in found.items() if digest in known)
+
+    uploaded_bytes = 0
+    failed = []
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {
+            pool.submit(upload_with_retries, path): (digest, path, size)
+            for digest, (path, size) in pending.items()
+        }
+        for future in as_completed(futures):
+            digest, path, size = futures[future]
+            file = future.result()
+            if file is None:
+                failed.append(path)
+                continue
+            known[digest] = {"file_id": file.id, "path": path, "size": size}
+            uploaded_bytes += size
+            logging.info(f"Uploaded {path} as {file.id}")
+    upload_seconds = time.perf_counter() - start
+
+    if uploaded_bytes:
+        manifest["upload_bytes_per_second"] = uploaded_bytes / max(upload_seconds, 1e-6)
+    save_manifest(manifest)
+
+    attached = [digest for digest in found if digest in known]
+    attached += fallback_digests(known, found, failed)
+    file_ids = sorted(known[digest]["file_id"] for digest in attached)
+    deleted = []
+    if assistant_id:
+        client.beta.assistants.update(assistant_id, file_ids=file_ids)
+        logging.info(f"Assistant {assistant_id} now has {len(file_ids)} files attached")
+
+        # Old versions are only safe to delete once the assistant stops referencing them
+        deleted = delete_superseded(manifest, superseded_digests(known, found, failed))
+        if deleted:
+            save_manifest(manifest)
+
+    throughput = manifest.get("upload_bytes_per_second") or DEFAULT_UPLOAD_BYTES_PER_SECOND
+    return {
+        "files_found": len(found),
+        "files_uploaded": len(pending) - len(failed),
+        "files_skipped": len(found) - len(pending),
+        "files_failed": failed,
+        "bytes_uploaded": uploaded_bytes,
+        "bytes_skipped": skipped_bytes,
+        "upload_seconds": round(upload_seconds, 2),
+        "estimated_seconds_saved": round(skipped_bytes / throughput, 2),
+        "file_ids": file_ids,
+        "files_deleted": deleted,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingest a folder of documents into the assistant")
+    parser.add_argument("directory", nargs="?", default="data")
+    parser.add_argument("--assistant-id", default=OPENAI_ASSISTANT_ID)
+    parser.add_argument("--workers", type=int, default=INGEST_MAX_WORKERS)
+    parser.add_argument("--no-attach", action="store_true", help="Upload without updating the assistant")
+    args = parser.parse_args(argv)
+
+    report = ingest_directory(
+        args.directory,
+        assistant_id=None if args.no_attach else args.assistant_id,
+        max_workers=args.workers,
+    )
+    print(json.dumps(report, indent=2))
+    return 1 if report["files_failed"] or report.get("error") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,358 @@
+import os
+import re
+import time
+import threading
+import unicodedata
+from collections import deque
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Longer messages are real questions and go to the model
+FAST_PATH_MAX_WORDS = int(os.getenv("FAST_PATH_MAX_WORDS", "12"))
+
+# Static office information, as given to the assistant in create_assistant
+OFFICE_INFO = {
+    "address": "4 Rue Berzélius, 75017 Paris",
+    "phone": "+33 1 42 63 63 63",
+    "email": "assistance@francilienimmo.com",
+    # Not part of the assistant's instructions, so only answered when configured
+    "hours": os.getenv("OFFICE_HOURS"),
+    "services": {
+        "fr": [
+            "Mise en location et recherche de locataire",
+            "Gestion locative complète",
+            "Syndic de copropriété (contrat conforme à la loi ALUR)",
+            "États des lieux et rédaction du bail",
+            "Accompagnement à la vente",
+            "Conseils juridiques, fiscaux et techniques",
+        ],
+        "en": [
+            "Letting your property and finding tenants",
+            "Full rental management",
+            "Co-ownership management (syndic, ALUR-compliant contract)",
+            "Inventories and lease drafting",
+            "Support with selling your property",
+            "Legal, tax and technical advice",
+        ],
+        "ar": [
+            "تأجير عقارك والبحث عن مستأجرين",
+            "إدارة إيجارية كاملة",
+            "إدارة الملكية المشتركة (سنديك وفق قانون ALUR)",
+            "معاينة الحالة وصياغة عقد الإيجار",
+            "المرافقة في بيع العقارات",
+            "استشارات قانونية وضريبية وتقنية",
+        ],
+    },
+}
+
+# (intent, language) -> keywords; matched on normalised text at word boundaries.
+# Single words only where they can't be about something else ("location" is a rental in French).
+KEYWORDS = {
+    ("address", "fr"): ["adresse", "ou etes vous", "ou se trouve", "ou vous trouver",
+                        "vos bureaux", "votre agence", "localisation"],
+    ("address", "en"): ["address", "where are you", "where are you located", "where is your office",
+                        "where are your offices", "your location"],
+    ("address", "ar"): ["عنوان", "العنوان", "عنوانكم", "اين مكتبكم", "اين تقع", "وين مكتبكم", "موقعكم"],
+    ("phone", "fr"): ["telephone", "numero de telephone", "votre numero", "vous appeler",
+                      "vous joindre"],
+    ("phone", "en"): ["phone number", "telephone", "call you", "your number"],
+    ("phone", "ar"): ["هاتف", "الهاتف", "رقم الهاتف", "رقمكم", "رقم الهاتف الخاص بكم", "نتصل بكم"],
+    ("email", "fr"): ["email", "e mail", "courriel", "adresse mail", "adresse email",
+                      "adresse e mail"],
+    ("email", "en"): ["email", "e mail", "email address"],
+    ("email", "ar"): ["ايميل", "الايميل", "البريد الالكتروني", "بريدكم"],
+    ("hours", "fr"): ["horaires", "horaire", "heures d ouverture", "etes vous ouvert",
+                      "vous etes ouvert"],
+    ("hours", "en"): ["opening hours", "office hours", "are you open", "when do you open"],
+    ("hours", "ar"): ["ساعات العمل", "مواعيد العمل", "متى تفتحون", "اوقات العمل"],
+    ("services", "fr"): ["vos services", "prestations", "que faites vous", "vous proposez quoi"],
+    ("services", "en"): ["your services", "what do you do", "what do you offer"],
+    ("services", "ar"): ["خدمات", "الخدمات", "خدماتكم", "ماذا تقدمون"],
+}
+
+# Words that may surround a question without changing it; anything else sends the
+# message to the model. Possessives like "mon"/"my" are left out on purpose: a
+# question about the sender's own things is not an office-information question.
+FILLER_WORDS = {
+    "fr": set(
+        "quel quelle quels quelles est sont c ce cest le la les l de du des d votre vos "
+        "pour svp s il vous plait merci bonjour bonsoir salut et ou me moi donner donnez "
+        "pouvez pourriez puis peux je j que qu aimerais voudrais connaitre savoir quoi comment "
+        "un une en sur qui y a au aux etes ouvert ouverts ouverte ouvertes "
+        "lundi mardi mercredi jeudi vendredi samedi dimanche".split()
+    ),
+    "en": set(
+        "what whats is are the your you a an of please pls thanks thank hi hello hey can "
+        "could would i get have me tell give do for and to on in it s at which open "
+        "monday tuesday wednesday thursday friday saturday sunday".split()
+    ),
+    "ar": {
+        "ما", "هو", "هي", "ماهو", "ماهي", "ممكن", "من", "فضلك", "لو", "سمحت", "شكرا",
+        "مرحبا", "السلام", "عليكم", "في", "على", "و", "هل", "اريد", "اعطني", "كم", "متى",
+    },
+}
+
+TEMPLATES = {
+    "fr": {
+        "address": "📍 Notre agence se trouve au {address}.",
+        "phone": "📞 Vous pouvez nous joindre au {phone}.",
+        "email": "📩 Écrivez-nous à {email}.",
+        "hours": "🕘 Nos horaires : {hours}.",
+        "services": "Nos services :\n{services}",
+        "closing": "N'hésitez pas à nous contacter pour toute autre question !",
+    },
+    "en": {
+        "address": "📍 Our office is at {address}.",
+        "phone": "📞 You can reach us on {phone}.",
+        "email": "📩 Write to us at {email}.",
+        "hours": "🕘 Our opening hours: {hours}.",
+        "services": "Our services:\n{services}",
+        "closing": "Feel free to ask us anything else!",
+    },
+    "ar": {
+        "address": "📍 مكتبنا في {address}.",
+        "phone": "📞 يمكنكم الاتصال بنا على {phone}.",
+        "email": "📩 راسلونا على {email}.",
+        "hours": "🕘 ساعات العمل: {hours}.",
+        "services": "خدماتنا:\n{services}",
+        "closing": "لا تترددوا في التواصل معنا لأي سؤال آخر!",
+    },
+}
+
+ARABIC_ALEF = str.maketrans({"أ": "ا", "إ": "ا", "آ": "ا", "ى": "ي"})
+
+
+def normalize(text):
+    """
+    Casefold, strip accents and Arabic diacritics, and collapse punctuation to spaces
+
+    :param text: Input text
+    :return: Normalised text padded with single spaces
+    """
+    text = unicodedata.normalize("NFKD", text.casefold().translate(ARABIC_ALEF))
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    text = re.sub(r"[\W_]+", " ", text)
+    return f" {text.strip()} "
+
+
+class KeywordAutomaton:
+    """
+    Aho-Corasick automaton matching every keyword in a single pass over the text
+    """
+
+    def __init__(self, keywords):
+        """
+        :param keywords: Iterable of (keyword, value) pairs
+        """
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        for keyword, value in keywords:
+            # Pad with spaces so matches fall on word boundaries
+            pattern = f" {normalize(keyword).strip()} "
+            state = 0
+            for char in pattern:
+                if char not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                    self.goto[state][char] = len(self.goto) - 1
+                state = self.goto[state][char]
+            self.output[state].append((len(pattern), value))
+
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                if self.fail[child] == child:
+                    self.fail[child] = 0
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+
+    def find(self, text):
+        """
+        Find keyword matches in normalised text
+
+        :param text: Output of normalize()
+        :return: List of (start, end, value)
+        """
+        matches = []
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            for length, value in self.output[state]:
+                matches.append((index + 1 - length, index + 1, value))
+        return matches
+
+
+def _keyword_languages():
+    # A keyword listed under several languages ("email") says nothing about the language
+    languages = {}
+    for (intent, language), keywords in KEYWORDS.items():
+        for keyword in keywords:
+            languages.setdefault((normalize(keyword).strip(), intent), set()).add(language)
+    return languages
+
+
+automaton = KeywordAutomaton(
+    (keyword, (intent, frozenset(languages)))
+    for (keyword, intent), languages in _keyword_languages().items()
+)
+
+# Filler words that only occur in one language, used as language evidence
+_FILLER_ONLY = {
+    language: words - set().union(*(other for name, other in FILLER_WORDS.items() if name != language))
+    for language, words in FILLER_WORDS.items()
+}
+_ALL_FILLER = set().union(*FILLER_WORDS.values())
+
+_stats = {"messages": 0, "matched": 0, "intents": {}, "fast_seconds": 0.0}
+_model_latency = {"runs": 0, "seconds": 0.0}
+_lock = threading.Lock()
+
+
+def detect_intents(text):
+    """
+    Detect office-information intents in a message
+
+    Overlapping matches keep the longest keyword, so "adresse mail" is an
+    email question rather than an address question. Messages with anything
+    besides keywords and filler words ("le prix de vos services de syndic")
+    are real questions and return no intents.
+
+    :param text: Message text
+    :return: Tuple of (ordered list of intents, language)
+    """
+    normalized = normalize(text)
+    if len(normalized.split()) > FAST_PATH_MAX_WORDS:
+        return [], None
+
+    matches = sorted(automaton.find(normalized), key=lambda m: (m[0] - m[1], m[0]))
+    taken = []
+    for start, end, key in matches:
+        # Neighbouring keywords share their boundary space
+        if all(end <= s + 1 or start >= e - 1 for s, e, _ in taken):
+            taken.append((start, end, key))
+    taken.sort()
+
+    if not taken:
+        return [], None
+
+    chars = list(normalized)
+    for start, end, _ in taken:
+        chars[start:end] = " " * (end - start)
+    leftover = "".join(chars).split()
+    if any(word not in _ALL_FILLER for word in leftover):
+        return [], None
+
+    intents = []
+    for _, _, (intent, _) in taken:
+        if intent not in intents:
+            intents.append(intent)
+    if re.search(r"[؀-ۿ]", text):
+        language = "ar"
+    else:
+        votes = {"fr": 0, "en": 0}
+        for _, _, (_, languages) in taken:
+            if len(languages) == 1 and set(languages) <= votes.keys():
+                votes[next(iter(languages))] += 1
+        for word in leftover:
+            for language in votes:
+                votes[language] += word in _FILLER_ONLY[language]
+        # French is the office's language, so it wins a tie
+        language = "en" if votes["en"] > votes["fr"] else "fr"
+    return intents, language
+
+
+def render_answer(intents, language, office_info=OFFICE_INFO):
+    """
+    Fill the templates for a set of intents
+
+    :param intents: Intents to answer
+    :param language: Reply language
+    :param office_info: Office information to answer from
+    :return: Reply text, or None if any intent has no configured answer
+    """
+    templates = TEMPLATES[language]
+    lines = []
+    for intent in intents:
+        if intent == "services":
+            services = office_info.get("services") or {}
+            services = services.get(language) or services.get("fr")
+            if not services:
+                return None
+            lines.append(templates["services"].format(services="\n".join(f"• {s}" for s in services)))
+        elif office_info.get(intent):
+            lines.append(templates[intent].format(**{intent: office_info[intent]}))
+        else:
+            return None
+    lines.append(templates["closing"])
+    return "\n\n".join(lines)
+
+
+def fast_path_reply(text, office_info=OFFICE_INFO):
+    """
+    Answer a message locally if it only asks for static office information
+
+    :param text: Message text
+    :param office_info: Office information for the tenant, or None to disable the fast path
+    :return: Reply text, or None to send the message to the model
+    """
+    if office_info is None:
+        return None
+    start = time.perf_counter()
+    intents, language = detect_intents(text)
+    reply = render_answer(intents, language, office_info) if intents else None
+    elapsed = time.perf_counter() - start
+    with _lock:
+        _stats["messages"] += 1
+        if reply is not None:
+            _stats["matched"] += 1
+            _stats["fast_seconds"] += elapsed
+            for intent in intents:
+                _stats["intents"][intent] = _stats["intents"].get(intent, 0) + 1
+    return reply
+
+
+def record_model_latency(seconds):
+    """
+    Record how long a reply took on the model path, to estimate time saved
+
+    :param seconds: Time spent generating the reply
+    """
+    with _lock:
+        _model_latency["runs"] += 1
+        _model_latency["seconds"] += seconds
+
+
+def get_intent_stats():
+    """
+    Match rate and latency saved by the fast path
+
+    :return: Dictionary of statistics
+    """
+    with _lock:
+        matched = _stats["matched"]
+        fast_avg = _stats["fast_seconds"] / matched if matched else 0.0
+        model_avg = (
+            _model_latency["seconds"] / _model_latency["runs"] if _model_latency["runs"] else None
+        )
+        return {
+            "messages": _stats["messages"],
+            "matched": matched,
+            "match_rate": round(matched / _stats["messages"], 3) if _stats["messages"] else 0.0,
+            "intents": dict(_stats["intents"]),
+            "fast_path_avg_ms": round(fast_avg * 1000, 3),
+            "model_path_avg_seconds": round(model_avg, 2) if model_avg is not None else None,
+            "estimated_seconds_saved": (
+                round(matched * (model_avg - fast_avg), 1) if model_avg is not None else None
+            ),
+        }
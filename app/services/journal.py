@@ -0,0 +1,385 @@
+import os
+import glob
+import json
+import time
+import signal
+import logging
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+try:
+    import fcntl
+except ImportError:  # Windows: single process only
+    fcntl = None
+
+# Load environment variables
+load_dotenv()
+
+# Base path; each worker process claims its own slot file next to it
+JOURNAL_PATH = os.getenv("JOURNAL_PATH", "journal.log")
+JOURNAL_FSYNC_INTERVAL = float(os.getenv("JOURNAL_FSYNC_INTERVAL_MS", "5")) / 1000
+JOURNAL_DRAIN_SECONDS = float(os.getenv("JOURNAL_DRAIN_SECONDS", "20"))
+JOURNAL_COMPACT_RECORDS = int(os.getenv("JOURNAL_COMPACT_RECORDS", "10000"))
+RECENT_IDS = 10000
+
+
+def slot_path(base_path, slot):
+    """
+    Journal file for a worker slot; slot 0 is the base path itself
+
+    :param base_path: JOURNAL_PATH
+    :param slot: Slot number
+    :return: Path of the slot's journal file
+    """
+    return base_path if slot == 0 else f"{base_path}.{slot}"
+
+
+def try_lock(path):
+    """
+    Take an exclusive, non-blocking lock on path's lock file
+
+    The lock is released by the OS when the holder dies, which is what marks
+    a slot as orphaned.
+
+    :param path: Journal file to lock
+    :return: Open lock file, or None if another process holds the lock
+    """
+    lock_file = open(f"{path}.lock", "a")
+    if fcntl is None:
+        return lock_file
+    try:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return None
+    return lock_file
+
+
+def read_pending(path):
+    """
+    Replay a journal file
+
+    :param path: Journal file
+    :return: OrderedDict of message ID -> body for messages accepted but never completed
+    """
+    pending = OrderedDict()
+    if not os.path.exists(path):
+        return pending
+    with open(path, "r", encoding="utf-8") as fileobj:
+        for line in fileobj:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # Torn final write from a crash
+                continue
+            if record["op"] == "accept":
+                pending[record["id"]] = record["body"]
+            else:
+                pending.pop(record["id"], None)
+    return pending
+
+
+class JournalError(Exception):
+    """
+    Raised when an accepted message cannot be made durable
+    """
+
+
+class Journal:
+    """
+    Append-only log of accepted inbound messages.
+
+    accept() returns only once the entry is on disk, but fsyncs are batched:
+    a commit thread syncs every JOURNAL_FSYNC_INTERVAL, so concurrent requests
+    share one fsync. complete() is not waited on; if the process dies before
+    it is synced the message is replayed and answered twice, never dropped.
+
+    Every worker process locks its own slot file, and adopts the files of
+    slots whose worker died. The commit thread rewrites the file down to its
+    incomplete entries every JOURNAL_COMPACT_RECORDS records.
+
+    If a sync or compaction fails, waiting and new accept() calls raise
+    JournalError until the commit thread has rebuilt the file from memory.
+    """
+
+    def __init__(
+        self,
+        base_path=JOURNAL_PATH,
+        fsync_interval=JOURNAL_FSYNC_INTERVAL,
+        compact_records=JOURNAL_COMPACT_RECORDS,
+    ):
+        self.base_path = base_path
+        self.path = None
+        self.slot_lock = None
+        self.fsync_interval = fsync_interval
+        self.compact_records = compact_records
+        self.file = None
+        self.lock = threading.Lock()
+        self.synced = threading.Condition(self.lock)
+        self.written_seq = 0
+        self.synced_seq = 0
+        self.compacted_seq = 0
+        self.compactions = 0
+        self.pending = OrderedDict()
+        self.recent = OrderedDict()
+        self.in_flight = 0
+        self.idle = threading.Condition()
+        self.closing = False
+        self.committer = None
+        self.error = None
+
+    def _claim_slot(self):
+        slot = 0
+        while True:
+            path = slot_path(self.base_path, slot)
+            lock_file = try_lock(path)
+            if lock_file is not None:
+                self.path = path
+                self.slot_lock = lock_file
+                return
+            slot += 1
+
+    def _lock_orphans(self):
+        # Slots left behind by workers that died (or are gone after scaling down)
+        orphans = []
+        if fcntl is None:
+            return orphans
+        for lock_path in sorted(glob.glob(f"{glob.escape(self.base_path)}*.lock")):
+            path = lock_path[: -len(".lock")]
+            if path == self.path or not os.path.exists(path):
+                continue
+            lock_file = try_lock(path)
+            if lock_file is not None:
+                orphans.append((path, lock_file))
+        return orphans
+
+    def _rewrite(self, pending):
+        # Replace the file with just the incomplete entries
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fileobj:
+            for message_id, body in pending.items():
+                fileobj.write(json.dumps({"op": "accept", "id": message_id, "body": body}) + "\n")
+            fileobj.flush()
+            os.fsync(fileobj.fileno())
+        os.replace(tmp_path, self.path)
+
+    def open(self):
+        """
+        Claim a journal slot, load it and any orphaned slots, compact and start the commit thread
+
+        :return: Webhook bodies of messages that were accepted but never completed
+        """
+        self._claim_slot()
+        pending = read_pending(self.path)
+        orphans = self._lock_orphans()
+        for path, _ in orphans:
+            orphaned = read_pending(path)
+            if orphaned:
+                logging.info(f"Adopting {len(orphaned)} incomplete messages from {path}")
+            for message_id, body in orphaned.items():
+                pending.setdefault(message_id, body)
+        self._rewrite(pending)
+
+        # Only now that their entries are durable in our file
+        for path, lock_file in orphans:
+            os.remove(path)
+            lock_file.close()
+
+        self.file = open(self.path, "a", encoding="utf-8")
+        self.pending = pending
+        self.recent.update((message_id, None) for message_id in pending)
+        self.committer = threading.Thread(target=self._commit_loop, name="journal-commit", daemon=True)
+        self.committer.start()
+        if pending:
+            logging.info(f"Journal {self.path} has {len(pending)} incomplete messages to replay")
+        return list(pending.values())
+
+    def _write(self, record):
+        # Caller holds self.lock
+        self.file.write(json.dumps(record) + "\n")
+        self.written_seq += 1
+        return self.written_seq
+
+    def _commit_loop(self):
+        while True:
+            time.sleep(self.fsync_interval)
+            try:
+                self._commit()
+            except Exception as e:
+                # Fail the waiting accepts rather than leaving them blocked forever
+                logging.error(f"Journal {self.path} commit failed: {e!r}")
+                with self.lock:
+                    self.error = e
+                    self.synced.notify_all()
+
+    def _commit(self):
+        with self.lock:
+            if self.error is not None:
+                # A failed fsync may have dropped writes, so rebuild the file from memory
+                self._compact()
+                self.error = None
+                logging.info(f"Journal {self.path} recovered")
+                return
+            target = self.written_seq
+            if target == self.synced_seq:
+                return
+            self.file.flush()
+        os.fsync(self.file.fileno())
+        with self.lock:
+            self.synced_seq = target
+            self.synced.notify_all()
+            if self.written_seq - self.compacted_seq >= self.compact_records:
+                self._compact()
+
+    def _compact(self):
+        # Caller holds self.lock; runs on the commit thread so no fsync races the swap
+        self.file.close()
+        try:
+            self._rewrite(self.pending)
+        finally:
+            self.file = open(self.path, "a", encoding="utf-8")
+        # Everything written so far is either in the new file or no longer needed
+        self.synced_seq = self.compacted_seq = self.written_seq
+        self.compactions += 1
+        self.synced.notify_all()
+
+    def accept(self, message_id, body):
+        """
+        Durably record an inbound message before it is acknowledged
+
+        :param message_id: WhatsApp message ID
+        :param body: Webhook request body
+        :return: False if the message was already accepted (a webhook redelivery)
+        :raises JournalError: If the message could not be made durable
+        """
+        with self.lock:
+            if message_id in self.recent:
+                return False
+            if self.error is not None:
+                raise JournalError(f"journal unavailable: {self.error!r}")
+            self.recent[message_id] = None
+            if len(self.recent) > RECENT_IDS:
+                self.recent.popitem(last=False)
+            self.pending[message_id] = body
+            seq = self._write({"op": "accept", "id": message_id, "body": body})
+            while self.synced_seq < seq:
+                if self.error is not None:
+                    # Not durable; let the redelivery be accepted once we recover
+                    self.pending.pop(message_id, None)
+                    self.recent.pop(message_id, None)
+                    raise JournalError(f"journal sync failed: {self.error!r}")
+                self.synced.wait()
+        return True
+
+    def complete(self, message_id):
+        """
+        Mark a message as answered
+
+        :param message_id: WhatsApp message ID
+        """
+        with self.lock:
+            self.pending.pop(message_id, None)
+            self._write({"op": "done", "id": message_id})
+
+    def forget(self, message_id):
+        """
+        Let a redelivery of a message that failed to process be accepted again
+
+        The entry stays open on disk, so the message is also replayed on restart.
+
+        :param message_id: WhatsApp message ID
+        """
+        with self.lock:
+            self.recent.pop(message_id, None)
+
+    def track(self):
+        """
+        Context manager counting a message as in flight until the block exits
+        """
+        return _InFlight(self)
+
+    def drain(self, timeout=JOURNAL_DRAIN_SECONDS):
+        """
+        Stop accepting work and wait for in-flight messages to finish
+
+        :param timeout: Maximum seconds to wait
+        :return: True if everything finished in time
+        """
+        self.closing = True
+        deadline = time.monotonic() + timeout
+        with self.idle:
+            while self.in_flight:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    logging.warning(f"Shutdown deadline hit with {self.in_flight} messages in flight")
+                    return False
+                self.idle.wait(remaining)
+        return True
+
+    def stats(self):
+        return {
+            "path": self.path,
+            "pending": len(self.pending),
+            "compactions": self.compactions,
+            "in_flight": self.in_flight,
+            "written": self.written_seq,
+            "synced": self.synced_seq,
+            "closing": self.closing,
+            "error": repr(self.error) if self.error else None,
+        }
+
+
+class _InFlight:
+    def __init__(self, journal):
+        self.journal = journal
+
+    def __enter__(self):
+        with self.journal.idle:
+            self.journal.in_flight += 1
+
+    def __exit__(self, *exc_info):
+        with self.journal.idle:
+            self.journal.in_flight -= 1
+            self.journal.idle.notify_all()
+
+
+journal = Journal()
+
+
+def start_journal(app, process):
+    """
+    Open the journal, replay incomplete messages in the background and drain on SIGTERM
+
+    :param app: Flask application (replay needs its app context)
+    :param process: Callable that handles one webhook body
+    """
+    pending = journal.open()
+
+    def replay():
+        with app.app_context():
+            for body in pending:
+                with journal.track():
+                    try:
+                        process(body)
+                    except Exception as e:
+                        logging.error(f"Replay failed: {e}")
+
+    if pending:
+        threading.Thread(target=replay, name="journal-replay", daemon=True).start()
+
+    previous = signal.getsignal(signal.SIGTERM)
+
+    def handle_sigterm(signum, frame):
+        logging.info("SIGTERM received, draining in-flight messages")
+        journal.drain()
+        if callable(previous):
+            previous(signum, frame)
+        else:
+            raise SystemExit(0)
+
+    try:
+        signal.signal(signal.SIGTERM, handle_sigterm)
+    except ValueError:
+        # Not in the main thread (e.g. some test runners); the server handles shutdown
+        pass
@@ -2,8 +2,14 @@ import shelve
 import os
 import time
 import logging
+import threading
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import OpenAI, BadRequestError
+from app.services.admission import admission
+from app.services.usage_store import record_run_usage
+from app.services.tools import execute_tool_calls, tool_definitions
+import app.services.property_tools  # noqa: F401 (registers the property tools)
+from app.tenants import current_tenant
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s: %(message)s')
@@ -16,6 +22,63 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 OPENAI_ASSISTANT_ID = os.getenv("OPENAI_ASSISTANT_ID")
 client = OpenAI(api_key=OPENAI_API_KEY)
 
+# End-to-end time budget for a reply, measured from when the message is accepted
+RUN_DEADLINE_SECONDS = float(os.getenv("RUN_DEADLINE_SECONDS", "25"))
+RUN_CANCEL_WAIT_SECONDS = float(os.getenv("RUN_CANCEL_WAIT_SECONDS", "5"))
+# Floor for per-call timeouts so calls made right at the deadline can still finish
+OPENAI_MIN_CALL_SECONDS = float(os.getenv("OPENAI_MIN_CALL_SECONDS", "1"))
+TERMINAL_RUN_STATUSES = ("completed", "failed", "cancelled", "expired", "incomplete")
+FALLBACK_REPLY = "Sorry, I'm experiencing some technical difficulties."
+TRANSCRIPTION_MODEL = os.getenv("OPENAI_TRANSCRIPTION_MODEL", "whisper-1")
+
+run_stats = {"statuses": {}, "cancel_seconds": []}
+run_stats_lock = threading.Lock()
+
+# One pooled client per OpenAI API key, for tenants billed separately
+tenant_clients = {}
+tenant_clients_lock = threading.Lock()
+
+def get_client(deadline=None):
+    """
+    OpenAI client for the current tenant
+    
+    :param deadline: Optional time.monotonic() value; calls time out when it is reached
+    :return: OpenAI client
+    """
+    tenant = current_tenant()
+    if tenant is None or not tenant.openai_api_key:
+        tenant_client = client
+    else:
+        with tenant_clients_lock:
+            if tenant.openai_api_key not in tenant_clients:
+                tenant_clients[tenant.openai_api_key] = OpenAI(api_key=tenant.openai_api_key)
+            tenant_client = tenant_clients[tenant.openai_api_key]
+    if deadline is None:
+        return tenant_client
+    remaining = deadline - time.monotonic()
+    # A retry would restart the full timeout and overrun the deadline
+    return tenant_client.with_options(
+        timeout=max(remaining, OPENAI_MIN_CALL_SECONDS), max_retries=0
+    )
+
+def get_assistant_id():
+    """
+    Assistant serving the current tenant
+    
+    :return: Assistant ID
+    """
+    tenant = current_tenant()
+    return (tenant and tenant.assistant_id) or OPENAI_ASSISTANT_ID
+
+def get_thread_store():
+    """
+    Shelve file holding the current tenant's wa_id -> thread mapping
+    
+    :return: Shelve filename
+    """
+    tenant = current_tenant()
+    return tenant.thread_store if tenant else "threads_db"
+
 def upload_file(path):
     """
     Upload a file for use with OpenAI Assistant
@@ -23,9 +86,21 @@ def upload_file(path):
     :param path: Path to the file to upload
     :return: Uploaded file object
     """
+    with open(path, "rb") as fileobj:
+        return upload_fileobj(fileobj, os.path.basename(path))
+
+def upload_fileobj(fileobj, filename, deadline=None):
+    """
+    Upload an open file object for use with OpenAI Assistant
+    
+    :param fileobj: Readable binary file object
+    :param filename: Name reported to OpenAI (its extension sets the file type)
+    :param deadline: Optional time.monotonic() value bounding the upload
+    :return: Uploaded file object
+    """
     try:
-        file = client.files.create(
-            file=open(path, "rb"), 
+        file = get_client(deadline).files.create(
+            file=(filename, fileobj),
             purpose="assistants"
         )
         return file
@@ -33,14 +108,46 @@ def upload_file(path):
         logging.error(f"File upload failed: {e}")
         return None
 
-def create_assistant(file=None):
+def delete_files(file_ids):
+    """
+    Delete uploaded files that are no longer needed
+    
+    :param file_ids: IDs of the files to delete
+    """
+    for file_id in file_ids:
+        try:
+            get_client().files.delete(file_id)
+        except Exception as e:
+            logging.warning(f"Failed to delete file {file_id}: {e}")
+
+def transcribe_fileobj(fileobj, filename, deadline=None):
+    """
+    Transcribe an audio file (e.g. a WhatsApp voice note)
+    
+    :param fileobj: Readable binary file object
+    :param filename: Name reported to OpenAI (its extension sets the audio format)
+    :param deadline: Optional time.monotonic() value bounding the call
+    :return: Transcript text, or None if transcription failed
+    """
+    try:
+        transcript = get_client(deadline).audio.transcriptions.create(
+            model=TRANSCRIPTION_MODEL,
+            file=(filename, fileobj),
+        )
+        return transcript.text
+    except Exception as e:
+        logging.error(f"Transcription failed: {e}")
+        return None
+
+def create_assistant(file=None, file_ids=None):
     """
     Create an OpenAI Assistant for auto-entrepreneur support
     
     :param file: Optional file to attach to the assistant
+    :param file_ids: Optional IDs of already uploaded files (see app.services.ingestion)
     :return: Created assistant object
     """
-    file_ids = [file.id] if file else []
+    file_ids = list(file_ids or []) + ([file.id] if file else [])
     
     assistant = client.beta.assistants.create(
         name="Hamza",
@@ -205,7 +312,7 @@ Première connexion ? Munissez-vous de votre code inscrit sur votre appel de fon
 
 """
         ),
-        tools=[{"type": "retrieval"}],
+        tools=[{"type": "retrieval"}] + tool_definitions(),
         model="gpt-4-1106-preview",
         file_ids=file_ids
     )
@@ -218,7 +325,7 @@ def check_thread_exists(wa_id):
     :param wa_id: WhatsApp ID
     :return: Thread ID if exists, None otherwise
     """
-    with shelve.open("threads_db") as threads_shelf:
+    with shelve.open(get_thread_store()) as threads_shelf:
         return threads_shelf.get(wa_id)
 
 def store_thread(wa_id, thread_id):
@@ -228,38 +335,132 @@ def store_thread(wa_id, thread_id):
     :param wa_id: WhatsApp ID
     :param thread_id: Thread ID to store
     """
-    with shelve.open("threads_db", writeback=True) as threads_shelf:
+    with shelve.open(get_thread_store(), writeback=True) as threads_shelf:
         threads_shelf[wa_id] = thread_id
 
-def run_assistant(thread, name):
+def record_run_outcome(status, time_to_cancel=None):
+    """
+    Count a run's terminal status
+    
+    :param status: Terminal status, or the reason a run was cancelled
+    :param time_to_cancel: Seconds between requesting and confirming a cancellation
+    """
+    with run_stats_lock:
+        run_stats["statuses"][status] = run_stats["statuses"].get(status, 0) + 1
+        if time_to_cancel is not None:
+            run_stats["cancel_seconds"].append(time_to_cancel)
+            del run_stats["cancel_seconds"][:-500]
+
+def get_run_stats():
+    """
+    Snapshot of terminal status counts and time-to-cancel
+    
+    :return: Dictionary of run statistics
+    """
+    with run_stats_lock:
+        cancel_seconds = sorted(run_stats["cancel_seconds"])
+        stats = {"statuses": dict(run_stats["statuses"])}
+    if cancel_seconds:
+        stats["time_to_cancel_seconds"] = {
+            "p50": round(cancel_seconds[len(cancel_seconds) // 2], 2),
+            "max": round(cancel_seconds[-1], 2),
+        }
+    return stats
+
+def cancel_run(thread_id, run, reason):
+    """
+    Cancel a run server-side and wait briefly for the cancellation to land
+    
+    :param thread_id: Thread ID
+    :param run: Run object
+    :param reason: Why the run is being cancelled, counted alongside terminal statuses
+    :return: Latest run object
+    """
+    started = time.monotonic()
+    cancel_deadline = started + RUN_CANCEL_WAIT_SECONDS
+    try:
+        run = get_client(cancel_deadline).beta.threads.runs.cancel(thread_id=thread_id, run_id=run.id)
+        while run.status not in TERMINAL_RUN_STATUSES:
+            if time.monotonic() > cancel_deadline:
+                logging.warning(f"Run {run.id} still {run.status} after cancel request")
+                record_run_outcome(reason)
+                return run
+            time.sleep(0.25)
+            run = get_client(cancel_deadline).beta.threads.runs.retrieve(
+                thread_id=thread_id, run_id=run.id
+            )
+    except Exception as e:
+        # The run may have finished between our last poll and the cancel
+        logging.error(f"Failed to cancel run {run.id}: {e}")
+        record_run_outcome(reason)
+        return run
+    record_run_outcome(reason, time.monotonic() - started)
+    return run
+
+def run_assistant(thread, name, wa_id=None, deadline=None):
     """
     Run the assistant for a given thread
     
     :param thread: Thread object
     :param name: User's name
+    :param wa_id: WhatsApp ID the run's usage is recorded against
+    :param deadline: time.monotonic() value by which a reply must be ready
     :return: Generated message
     """
+    if deadline is None:
+        deadline = time.monotonic() + RUN_DEADLINE_SECONDS
+
+    run = None
     try:
         # Retrieve the Assistant
-        assistant = client.beta.assistants.retrieve(OPENAI_ASSISTANT_ID)
+        assistant = get_client(deadline).beta.assistants.retrieve(get_assistant_id())
 
         # Run the assistant
-        run = client.beta.threads.runs.create(
+        run = get_client(deadline).beta.threads.runs.create(
             thread_id=thread.id,
             assistant_id=assistant.id,
         )
 
-        # Wait for completion
-        while run.status not in ["completed", "failed"]:
-            time.sleep(0.5)
-            run = client.beta.threads.runs.retrieve(thread_id=thread.id, run_id=run.id)
-
-        if run.status == "failed":
-            logging.error(f"Assistant run failed: {run.last_error}")
-            return "Sorry, I'm experiencing some technical difficulties."
+        started = time.perf_counter()
+
+        # Wait for a terminal status, backing off between polls
+        interval = 0.25
+        while run.status not in TERMINAL_RUN_STATUSES:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                logging.warning(f"Run {run.id} missed its deadline while {run.status}, cancelling")
+                run = cancel_run(thread.id, run, "deadline_exceeded")
+                break
+            if run.status == "requires_action":
+                # Run every requested tool at once and submit all outputs together
+                tool_outputs = execute_tool_calls(
+                    run.required_action.submit_tool_outputs.tool_calls, deadline, wa_id
+                )
+                run = get_client(deadline).beta.threads.runs.submit_tool_outputs(
+                    thread_id=thread.id, run_id=run.id, tool_outputs=tool_outputs
+                )
+                interval = 0.25
+                continue
+            time.sleep(min(interval, remaining))
+            interval = min(interval * 1.5, 2.0)
+            run = get_client(deadline).beta.threads.runs.retrieve(
+                thread_id=thread.id, run_id=run.id
+            )
+
+        record_run_usage(wa_id or name, thread.id, run, time.perf_counter() - started)
+
+        # Feed actual usage back into the token budget, failed runs included
+        if run.usage:
+            admission.record_usage(run.usage.total_tokens)
+        if run.status in TERMINAL_RUN_STATUSES:
+            record_run_outcome(run.status)
+
+        if run.status != "completed":
+            logging.error(f"Assistant run ended {run.status}: {run.last_error}")
+            return FALLBACK_REPLY
 
         # Retrieve the Messages
-        messages = client.beta.threads.messages.list(thread_id=thread.id)
+        messages = get_client(deadline).beta.threads.messages.list(thread_id=thread.id)
         new_message = messages.data[0].content[0].text.value
         
         logging.info(f"Generated message for {name}")
@@ -267,35 +468,55 @@ def run_assistant(thread, name):
 
     except Exception as e:
         logging.error(f"Error in running assistant: {e}")
+        # Don't leave the run going (and the thread locked) after giving up on it
+        if run is not None and run.status not in TERMINAL_RUN_STATUSES:
+            cancel_run(thread.id, run, "error")
         return "Sorry, I couldn't process your request at the moment."
 
-def generate_response(message_body, wa_id, name):
+def generate_response(message_body, wa_id, name, file_ids=None, deadline=None):
     """
     Generate a response for a given message
     
     :param message_body: Incoming message
     :param wa_id: WhatsApp ID
     :param name: User's name
+    :param file_ids: Optional uploaded file IDs to attach to the message
+    :param deadline: time.monotonic() value by which a reply must be ready
     :return: Generated response
     """
+    if deadline is None:
+        deadline = time.monotonic() + RUN_DEADLINE_SECONDS
+
     # Check if thread exists
     thread_id = check_thread_exists(wa_id)
 
     # Create or retrieve thread
     if thread_id is None:
         logging.info(f"Creating new thread for {name}")
-        thread = client.beta.threads.create()
+        thread = get_client(deadline).beta.threads.create()
         store_thread(wa_id, thread.id)
     else:
         logging.info(f"Retrieving existing thread for {name}")
-        thread = client.beta.threads.retrieve(thread_id)
+        thread = get_client(deadline).beta.threads.retrieve(thread_id)
 
     # Add message to thread
-    client.beta.threads.messages.create(
-        thread_id=thread.id,
-        role="user",
-        content=message_body,
-    )
+    try:
+        get_client(deadline).beta.threads.messages.create(
+            thread_id=thread.id,
+            role="user",
+            content=message_body,
+            file_ids=file_ids or [],
+        )
+    except BadRequestError as e:
+        if not file_ids:
+            raise
+        # Rejected attachment: still answer the text
+        logging.error(f"Attachment rejected, sending message without it: {e}")
+        get_client(deadline).beta.threads.messages.create(
+            thread_id=thread.id,
+            role="user",
+            content=message_body + " (The attachment could not be processed.)",
+        )
 
     # Run assistant and get response
-    return run_assistant(thread, name)
\ No newline at end of file
+    return run_assistant(thread, name, wa_id, deadline)
\ No newline at end of file
@@ -0,0 +1,96 @@
+import os
+import json
+import threading
+from dotenv import load_dotenv
+from app.services.tools import tool
+
+# Load environment variables
+load_dotenv()
+
+# JSON export from the property management system
+PROPERTY_DATA_PATH = os.getenv("PROPERTY_DATA_PATH", "data/properties.json")
+
+_data = {"mtime": None, "content": {}}
+_data_lock = threading.Lock()
+
+
+def load_property_data():
+    """
+    Load the property data export, re-reading it only when the file changes
+
+    :return: Dictionary with "leases", "properties", "viewing_slots" and "syndic_quotes"
+    """
+    try:
+        mtime = os.path.getmtime(PROPERTY_DATA_PATH)
+    except OSError:
+        return {}
+    with _data_lock:
+        if _data["mtime"] != mtime:
+            with open(PROPERTY_DATA_PATH, "r", encoding="utf-8") as fileobj:
+                _data["content"] = json.load(fileobj)
+            _data["mtime"] = mtime
+        return _data["content"]
+
+
+def normalize_wa_id(wa_id):
+    return "".join(char for char in str(wa_id or "") if char.isdigit())
+
+
+def is_authorized(record, wa_id):
+    """
+    Check that a sender may see a record from the property data
+
+    Records list the WhatsApp numbers of their tenants, owners or requesters
+    in "wa_ids". Unknown references and other people's records look the same
+    to the caller, so references can't be probed.
+
+    :param record: Lease, quote or property record, or None
+    :param wa_id: WhatsApp ID of the sender
+    :return: True if the sender is listed on the record
+    """
+    if record is None or not normalize_wa_id(wa_id):
+        return False
+    allowed = {normalize_wa_id(value) for value in record.get("wa_ids", [])}
+    return normalize_wa_id(wa_id) in allowed
+
+
+@tool(cache_ttl=60)
+def get_rent_balance(lease_reference: str, wa_id=None):
+    """
+    Look up the outstanding rent balance for one of the sender's leases.
+    """
+    lease = load_property_data().get("leases", {}).get(lease_reference)
+    if not is_authorized(lease, wa_id):
+        return {"found": False}
+    return {
+        "found": True,
+        "balance": lease.get("rent_balance"),
+        "currency": lease.get("currency", "EUR"),
+        "next_due_date": lease.get("next_due_date"),
+    }
+
+
+@tool(cache_ttl=30)
+def get_viewing_slots(property_reference: str, limit: int = 5, wa_id=None):
+    """
+    List the next available viewing slots for a listed property or one of the sender's properties.
+    """
+    data = load_property_data()
+    slots = data.get("viewing_slots", {}).get(property_reference)
+    listing = data.get("properties", {}).get(property_reference)
+    # Properties on the market are open to any prospect
+    visible = bool(listing and listing.get("listed")) or is_authorized(listing, wa_id)
+    if slots is None or not visible:
+        return {"found": False}
+    return {"found": True, "slots": slots[:limit]}
+
+
+@tool(cache_ttl=60)
+def get_syndic_quote_status(quote_reference: str, wa_id=None):
+    """
+    Get the status of one of the sender's syndic (co-ownership management) quote requests.
+    """
+    quote = load_property_data().get("syndic_quotes", {}).get(quote_reference)
+    if not is_authorized(quote, wa_id):
+        return {"found": False}
+    return {"found": True, "status": quote.get("status"), "updated": quote.get("updated")}
@@ -0,0 +1,153 @@
+import os
+import time
+from dotenv import load_dotenv
+from app.utils.batch_writer import BatchWriter
+from app.utils.sqlite_store import SQLiteStore
+
+# Load environment variables
+load_dotenv()
+
+STATUS_DB_PATH = os.getenv("STATUS_DB_PATH", "statuses.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS message_statuses (
+    message_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    recipient_id TEXT,
+    error_code INTEGER,
+    PRIMARY KEY (message_id, status)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS message_statuses_ts ON message_statuses (ts);
+CREATE TABLE IF NOT EXISTS status_errors (
+    error_code INTEGER PRIMARY KEY,
+    title TEXT
+);
+"""
+
+store = SQLiteStore(STATUS_DB_PATH, SCHEMA)
+
+
+def parse_statuses(body):
+    """
+    Pull status events out of a webhook body
+
+    :param body: Webhook request body
+    :return: List of (message_id, status, ts, recipient_id, error_code, error_title)
+    """
+    events = []
+    for entry in body.get("entry", []):
+        for change in entry.get("changes", []):
+            for status in change.get("value", {}).get("statuses", []):
+                errors = status.get("errors") or [{}]
+                events.append(
+                    (
+                        status.get("id"),
+                        status.get("status"),
+                        int(status.get("timestamp", time.time())),
+                        status.get("recipient_id"),
+                        errors[0].get("code"),
+                        errors[0].get("title"),
+                    )
+                )
+    return events
+
+
+def write_statuses(events):
+    """
+    Append a batch of status events; webhook redeliveries are ignored
+
+    :param events: Events as returned by parse_statuses
+    """
+    connection = store.connection()
+    with connection:
+        connection.executemany(
+            "INSERT OR IGNORE INTO message_statuses VALUES (?, ?, ?, ?, ?)",
+            [event[:5] for event in events],
+        )
+        connection.executemany(
+            "INSERT OR IGNORE INTO status_errors VALUES (?, ?)",
+            {(event[4], event[5]) for event in events if event[4] is not None},
+        )
+
+
+writer = BatchWriter("status-writer", write_statuses)
+
+
+def record_statuses(body):
+    """
+    Queue every status event in a webhook body for writing
+
+    :param body: Webhook request body
+    :return: Number of events queued
+    """
+    events = parse_statuses(body)
+    for event in events:
+        writer.submit(event)
+    return len(events)
+
+
+def _percentiles(values, points=(50, 90, 95, 99)):
+    if not values:
+        return {}
+    values = sorted(values)
+    return {
+        f"p{point}": values[min(len(values) - 1, int(len(values) * point / 100))]
+        for point in points
+    }
+
+
+def status_report(since_seconds=86400):
+    """
+    Delivery latency percentiles and failure codes over a recent window
+
+    :param since_seconds: Size of the window, in seconds
+    :return: Report dictionary
+    """
+    since = int(time.time()) - since_seconds
+    connection = store.connection()
+    rows = connection.execute(
+        """
+        SELECT
+            MAX(CASE WHEN status = 'sent' THEN ts END),
+            MAX(CASE WHEN status = 'delivered' THEN ts END),
+            MAX(CASE WHEN status = 'read' THEN ts END)
+        FROM message_statuses
+        WHERE message_id IN (
+            SELECT message_id FROM message_statuses WHERE status = 'sent' AND ts >= ?
+        )
+        GROUP BY message_id
+        """,
+        (since,),
+    ).fetchall()
+
+    latencies = {"sent_to_delivered": [], "delivered_to_read": [], "sent_to_read": []}
+    for sent, delivered, read in rows:
+        if delivered is not None:
+            latencies["sent_to_delivered"].append(delivered - sent)
+        if delivered is not None and read is not None:
+            latencies["delivered_to_read"].append(read - delivered)
+        if read is not None:
+            latencies["sent_to_read"].append(read - sent)
+
+    failures = connection.execute(
+        """
+        SELECT s.error_code, e.title, COUNT(*)
+        FROM message_statuses s LEFT JOIN status_errors e USING (error_code)
+        WHERE s.status = 'failed' AND s.ts >= ?
+        GROUP BY s.error_code ORDER BY COUNT(*) DESC
+        """,
+        (since,),
+    ).fetchall()
+
+    return {
+        "messages": len(rows),
+        "latency_seconds": {
+            name: _percentiles(values) for name, values in latencies.items()
+        },
+        "failures": [
+            {"error_code": code, "title": title, "count": count}
+            for code, title, count in failures
+        ],
+        "writer": writer.stats(),
+    }
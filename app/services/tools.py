@@ -0,0 +1,238 @@
+import os
+import json
+import time
+import inspect
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Tool execution settings
+TOOL_MAX_WORKERS = int(os.getenv("TOOL_MAX_WORKERS", "8"))
+TOOL_DEFAULT_TIMEOUT = float(os.getenv("TOOL_DEFAULT_TIMEOUT", "5"))
+
+JSON_TYPES = {str: "string", int: "integer", float: "number", bool: "boolean"}
+
+# Handler parameters filled in server-side from the message being answered;
+# never exposed to or accepted from the model
+CONTEXT_PARAMETERS = ("wa_id",)
+
+registry = {}
+executor = ThreadPoolExecutor(max_workers=TOOL_MAX_WORKERS, thread_name_prefix="tool")
+
+_cache = {}
+_stats = {}
+_lock = threading.Lock()
+
+
+class Tool:
+    """
+    A locally executed function the assistant can call
+    """
+
+    def __init__(self, handler, name, description, timeout, cache_ttl):
+        self.handler = handler
+        self.name = name
+        self.description = description
+        self.timeout = timeout
+        self.cache_ttl = cache_ttl
+        self.signature = inspect.signature(handler)
+        self.context = [name for name in self.signature.parameters if name in CONTEXT_PARAMETERS]
+
+    def definition(self):
+        """
+        OpenAI function tool definition built from the handler's type hints
+
+        :return: Tool definition dictionary
+        """
+        properties = {}
+        required = []
+        for parameter in self.signature.parameters.values():
+            if parameter.name in self.context:
+                continue
+            properties[parameter.name] = {
+                "type": JSON_TYPES.get(parameter.annotation, "string")
+            }
+            if parameter.default is inspect.Parameter.empty:
+                required.append(parameter.name)
+        return {
+            "type": "function",
+            "function": {
+                "name": self.name,
+                "description": self.description,
+                "parameters": {
+                    "type": "object",
+                    "properties": properties,
+                    "required": required,
+                },
+            },
+        }
+
+    def bind(self, arguments, context=None):
+        """
+        Validate and coerce model-supplied arguments to the handler's types
+
+        :param arguments: Decoded arguments
+        :param context: Server-side values for the handler's context parameters
+        :return: Keyword arguments for the handler
+        :raises TypeError: If arguments are missing, unknown or of the wrong type
+        """
+        if not isinstance(arguments, dict):
+            raise TypeError("arguments must be an object")
+        for name in CONTEXT_PARAMETERS:
+            if name in arguments:
+                raise TypeError(f"unexpected argument {name}")
+        context = context or {}
+        bound = self.signature.bind(
+            **arguments, **{name: context.get(name) for name in self.context}
+        )
+        for name, value in bound.arguments.items():
+            if name in self.context:
+                continue
+            annotation = self.signature.parameters[name].annotation
+            if annotation in JSON_TYPES and not isinstance(value, annotation):
+                try:
+                    bound.arguments[name] = annotation(value)
+                except (TypeError, ValueError):
+                    raise TypeError(f"{name} must be {JSON_TYPES[annotation]}")
+        return bound.arguments
+
+
+def tool(name=None, timeout=TOOL_DEFAULT_TIMEOUT, cache_ttl=0):
+    """
+    Decorator registering a typed function as an assistant tool
+
+    The first line of the docstring becomes the tool description.
+
+    :param name: Tool name, defaults to the function name
+    :param timeout: Seconds before the call is abandoned
+    :param cache_ttl: Seconds results are cached per argument set (0 disables caching)
+    """
+
+    def register(handler):
+        description = (inspect.getdoc(handler) or "").split("\n")[0]
+        registered = Tool(handler, name or handler.__name__, description, timeout, cache_ttl)
+        registry[registered.name] = registered
+        return handler
+
+    return register
+
+
+def tool_definitions():
+    """
+    Definitions of every registered tool, for create_assistant
+
+    :return: List of tool definitions
+    """
+    return [registered.definition() for registered in registry.values()]
+
+
+def _record(name, seconds, outcome):
+    with _lock:
+        stats = _stats.setdefault(
+            name, {"calls": 0, "total_seconds": 0.0, "max_seconds": 0.0}
+        )
+        stats["calls"] += 1
+        stats["total_seconds"] += seconds
+        stats["max_seconds"] = max(stats["max_seconds"], seconds)
+        stats[outcome] = stats.get(outcome, 0) + 1
+
+
+def get_tool_stats():
+    """
+    Per-tool call counts, outcomes and latency
+
+    :return: Dictionary keyed by tool name
+    """
+    with _lock:
+        return {
+            name: dict(
+                stats,
+                avg_seconds=round(stats["total_seconds"] / stats["calls"], 3),
+                total_seconds=round(stats["total_seconds"], 3),
+                max_seconds=round(stats["max_seconds"], 3),
+            )
+            for name, stats in _stats.items()
+        }
+
+
+def _call(registered, kwargs):
+    start = time.perf_counter()
+    result = registered.handler(**kwargs)
+    return json.dumps(result, default=str), time.perf_counter() - start
+
+
+def execute_tool_calls(tool_calls, deadline=None, wa_id=None):
+    """
+    Run every requested tool call concurrently and collect their outputs
+
+    A turn costs as long as its slowest tool. Calls that time out or fail
+    return an error object to the model instead of failing the run; a
+    timed-out handler keeps running in the pool until it returns.
+
+    :param tool_calls: Tool calls from run.required_action.submit_tool_outputs
+    :param deadline: Optional time.monotonic() value no call may run past
+    :param wa_id: WhatsApp ID of the sender, passed to handlers that take one
+    :return: List of tool outputs ready for submit_tool_outputs
+    """
+    context = {"wa_id": wa_id}
+    outputs = {}
+    pending = []
+    now = time.monotonic()
+
+    for call in tool_calls:
+        name = call.function.name
+        registered = registry.get(name)
+        if registered is None:
+            outputs[call.id] = json.dumps({"error": f"Unknown tool {name}"})
+            _record(name, 0.0, "errors")
+            continue
+        try:
+            kwargs = registered.bind(json.loads(call.function.arguments or "{}"), context)
+        except (TypeError, ValueError) as e:
+            outputs[call.id] = json.dumps({"error": f"Invalid arguments: {e}"})
+            _record(name, 0.0, "errors")
+            continue
+
+        # Results may be specific to the sender, so never share them across senders
+        cache_key = (name, wa_id, json.dumps(kwargs, sort_keys=True, default=str))
+        with _lock:
+            cached = _cache.get(cache_key)
+        if cached and cached[1] > now:
+            outputs[call.id] = cached[0]
+            _record(name, 0.0, "cache_hits")
+            continue
+
+        call_deadline = now + registered.timeout
+        if deadline is not None:
+            call_deadline = min(call_deadline, deadline)
+        future = executor.submit(_call, registered, kwargs)
+        pending.append((call, registered, cache_key, call_deadline, future))
+
+    for call, registered, cache_key, call_deadline, future in pending:
+        try:
+            output, seconds = future.result(timeout=max(0.0, call_deadline - time.monotonic()))
+        except FutureTimeoutError:
+            logging.warning(f"Tool {registered.name} timed out")
+            outputs[call.id] = json.dumps({"error": "The lookup timed out"})
+            _record(registered.name, time.monotonic() - now, "timeouts")
+            continue
+        except Exception as e:
+            logging.error(f"Tool {registered.name} failed: {e}")
+            outputs[call.id] = json.dumps({"error": "The lookup failed"})
+            _record(registered.name, time.monotonic() - now, "errors")
+            continue
+        outputs[call.id] = output
+        _record(registered.name, seconds, "ok")
+        if registered.cache_ttl:
+            with _lock:
+                if len(_cache) > 1000:
+                    expired = [key for key, (_, expiry) in _cache.items() if expiry <= now]
+                    for key in expired:
+                        del _cache[key]
+                _cache[cache_key] = (output, time.monotonic() + registered.cache_ttl)
+
+    return [{"tool_call_id": call.id, "output": outputs[call.id]} for call in tool_calls]
@@ -0,0 +1,176 @@
+import os
+import time
+from dotenv import load_dotenv
+from app.utils.batch_writer import BatchWriter
+from app.utils.sqlite_store import SQLiteStore
+
+# Load environment variables
+load_dotenv()
+
+USAGE_DB_PATH = os.getenv("USAGE_DB_PATH", "usage.db")
+
+# USD per million (prompt, completion) tokens
+MODEL_PRICES = {
+    "gpt-4-1106-preview": (10.0, 30.0),
+    "gpt-4-turbo": (10.0, 30.0),
+    "gpt-4o": (2.5, 10.0),
+    "gpt-4o-mini": (0.15, 0.6),
+    "gpt-3.5-turbo": (0.5, 1.5),
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS run_usage (
+    ts REAL NOT NULL,
+    wa_id TEXT NOT NULL,
+    thread_id TEXT NOT NULL,
+    run_id TEXT,
+    model TEXT,
+    status TEXT,
+    prompt_tokens INTEGER NOT NULL,
+    completion_tokens INTEGER NOT NULL,
+    wall_seconds REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS run_usage_ts ON run_usage (ts);
+CREATE INDEX IF NOT EXISTS run_usage_thread ON run_usage (thread_id, ts);
+"""
+
+store = SQLiteStore(USAGE_DB_PATH, SCHEMA)
+
+
+def write_usage(records):
+    """
+    Append a batch of run usage records
+
+    :param records: Tuples matching the run_usage columns
+    """
+    connection = store.connection()
+    with connection:
+        connection.executemany(
+            "INSERT INTO run_usage VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", records
+        )
+
+
+writer = BatchWriter("usage-writer", write_usage, max_batch=200, interval=2.0)
+
+
+def record_run_usage(wa_id, thread_id, run, wall_seconds):
+    """
+    Queue the token usage and timing of a finished run
+
+    :param wa_id: WhatsApp ID
+    :param thread_id: Thread ID
+    :param run: Finished run object
+    :param wall_seconds: Time from run creation to its terminal status
+    """
+    usage = run.usage
+    writer.submit(
+        (
+            time.time(),
+            wa_id,
+            thread_id,
+            run.id,
+            run.model,
+            run.status,
+            usage.prompt_tokens if usage else 0,
+            usage.completion_tokens if usage else 0,
+            wall_seconds,
+        )
+    )
+
+
+def estimate_cost(model, prompt_tokens, completion_tokens):
+    """
+    Estimate the cost of a number of tokens
+
+    :return: Cost in USD, or None for an unknown model
+    """
+    prices = MODEL_PRICES.get(model)
+    if prices is None:
+        return None
+    return (prompt_tokens * prices[0] + completion_tokens * prices[1]) / 1_000_000
+
+
+def usage_report(since_seconds=86400, limit=10):
+    """
+    Top consumers, tokens per reply and latency against thread length
+
+    :param since_seconds: Size of the window, in seconds
+    :param limit: Number of top consumers to list
+    :return: Report dictionary
+    """
+    since = time.time() - since_seconds
+    connection = store.connection()
+
+    top = connection.execute(
+        """
+        SELECT wa_id, model, COUNT(*), SUM(prompt_tokens), SUM(completion_tokens), AVG(wall_seconds)
+        FROM run_usage WHERE ts >= ?
+        GROUP BY wa_id, model
+        ORDER BY SUM(prompt_tokens + completion_tokens) DESC LIMIT ?
+        """,
+        (since, limit),
+    ).fetchall()
+
+    totals = connection.execute(
+        """
+        SELECT model, COUNT(*), SUM(prompt_tokens), SUM(completion_tokens), AVG(wall_seconds)
+        FROM run_usage WHERE ts >= ? AND status = 'completed'
+        GROUP BY model
+        """,
+        (since,),
+    ).fetchall()
+
+    # Turn number within the thread, counted over the thread's whole history
+    by_turn = connection.execute(
+        """
+        SELECT
+            CASE WHEN turn <= 1 THEN '1' WHEN turn <= 5 THEN '2-5'
+                 WHEN turn <= 20 THEN '6-20' ELSE '21+' END AS bucket,
+            COUNT(*), AVG(prompt_tokens), AVG(wall_seconds), MAX(wall_seconds)
+        FROM (
+            SELECT ts, prompt_tokens, wall_seconds,
+                   ROW_NUMBER() OVER (PARTITION BY thread_id ORDER BY ts) AS turn
+            FROM run_usage
+        )
+        WHERE ts >= ?
+        GROUP BY bucket ORDER BY MIN(turn)
+        """,
+        (since,),
+    ).fetchall()
+
+    return {
+        "top_consumers": [
+            {
+                "wa_id": wa_id,
+                "model": model,
+                "runs": runs,
+                "prompt_tokens": prompt,
+                "completion_tokens": completion,
+                "cost_usd": estimate_cost(model, prompt, completion),
+                "avg_wall_seconds": round(wall, 2),
+            }
+            for wa_id, model, runs, prompt, completion, wall in top
+        ],
+        "per_reply": [
+            {
+                "model": model,
+                "replies": runs,
+                "prompt_tokens_per_reply": round(prompt / runs),
+                "completion_tokens_per_reply": round(completion / runs),
+                "cost_usd_per_reply": estimate_cost(model, prompt / runs, completion / runs),
+                "avg_wall_seconds": round(wall, 2),
+            }
+            for model, runs, prompt, completion, wall in totals
+        ],
+        "by_thread_length": [
+            {
+                "turns": bucket,
+                "runs": runs,
+                "avg_prompt_tokens": round(prompt),
+                "avg_wall_seconds": round(wall, 2),
+                "max_wall_seconds": round(max_wall, 2),
+            }
+            for bucket, runs, prompt, wall, max_wall in by_turn
+        ],
+        "writer": writer.stats(),
+    }
@@ -0,0 +1,237 @@
+import os
+import re
+import json
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_MAX_CONCURRENCY = 4
+
+# Left behind by os.path.expandvars when the variable is not set
+UNRESOLVED_VARIABLE = re.compile(r"\$(\w+|\{[^}]*\})")
+REQUIRED_FIELDS = ("phone_number_id", "access_token", "app_secret")
+# Contact details the fast-path intent router can answer; "services" maps language -> list
+OFFICE_INFO_FIELDS = ("address", "phone", "email", "hours")
+
+
+class TenantConfigError(Exception):
+    """
+    Raised at startup when a tenant is missing a credential or references an unset variable
+    """
+
+
+class Tenant:
+    """
+    One brand served by this deployment: a WhatsApp number and its assistant
+    """
+
+    def __init__(
+        self,
+        name,
+        phone_number_id,
+        access_token,
+        app_secret,
+        version="v18.0",
+        verify_token=None,
+        assistant_id=None,
+        openai_api_key=None,
+        thread_store=None,
+        max_concurrency=DEFAULT_MAX_CONCURRENCY,
+        office_info=None,
+    ):
+        self.name = name
+        self.phone_number_id = phone_number_id
+        self.access_token = access_token
+        self.app_secret = app_secret
+        self.version = version
+        self.verify_token = verify_token
+        self.assistant_id = assistant_id
+        self.openai_api_key = openai_api_key
+        self.thread_store = thread_store or f"threads_db_{name}"
+        self.max_concurrency = max_concurrency
+        # Static contact details for the fast-path intent router (None disables it)
+        self.office_info = office_info
+        self.slots = threading.BoundedSemaphore(max_concurrency)
+
+        # Pooled connections to the Graph API, sized for this tenant's concurrency
+        self.http = requests.Session()
+        self.http.mount("https://", HTTPAdapter(pool_maxsize=max_concurrency * 2))
+
+    def validate(self):
+        """
+        Check the tenant has everything it needs to receive and answer messages
+
+        :raises TenantConfigError: If a credential is empty or office_info is malformed
+        """
+        for field in REQUIRED_FIELDS:
+            if not getattr(self, field):
+                raise TenantConfigError(f"Tenant {self.name}: {field} is empty")
+        if self.office_info is not None:
+            self.validate_office_info()
+
+    def validate_office_info(self):
+        """
+        Check office_info has the shape the fast-path intent router reads
+
+        Every field is optional; questions about a missing one go to the model.
+
+        :raises TenantConfigError: If a field is unknown or has the wrong type
+        """
+        if not isinstance(self.office_info, dict):
+            raise TenantConfigError(f"Tenant {self.name}: office_info must be an object")
+        for field, value in self.office_info.items():
+            if field in OFFICE_INFO_FIELDS:
+                if value is not None and not isinstance(value, str):
+                    raise TenantConfigError(
+                        f"Tenant {self.name}: office_info.{field} must be a string"
+                    )
+            elif field == "services":
+                if not isinstance(value, dict) or not all(
+                    isinstance(services, list) and all(isinstance(s, str) for s in services)
+                    for services in value.values()
+                ):
+                    raise TenantConfigError(
+                        f"Tenant {self.name}: office_info.services must map languages "
+                        "to lists of strings"
+                    )
+            else:
+                raise TenantConfigError(
+                    f"Tenant {self.name}: office_info.{field} is not a known field"
+                )
+
+    def graph_url(self, path):
+        return f"https://graph.facebook.com/{self.version}/{path}"
+
+    def auth_headers(self):
+        return {"Authorization": f"Bearer {self.access_token}"}
+
+
+tenants_by_phone_number_id = {}
+default_tenant = None
+_current_tenant = ContextVar("current_tenant", default=None)
+
+
+def expand_entry(entry):
+    """
+    Resolve environment variable references in a tenants file entry
+
+    :param entry: Tenant entry from TENANTS_FILE
+    :return: Entry with every "$NAME" replaced by its value
+    :raises TenantConfigError: If a referenced variable is not set
+    """
+    expanded = {}
+    for key, value in entry.items():
+        if isinstance(value, str):
+            value = os.path.expandvars(value)
+            unresolved = UNRESOLVED_VARIABLE.search(value)
+            if unresolved:
+                raise TenantConfigError(
+                    f"Tenant {entry.get('name')}: {key} references {unresolved.group(0)}, "
+                    "which is not set"
+                )
+        expanded[key] = value
+    return expanded
+
+
+def load_tenants(config):
+    """
+    Build the tenant table from TENANTS_FILE plus a default tenant from the environment
+
+    Values in the tenants file may reference environment variables ("$ACCESS_TOKEN_BRAND_A")
+    so secrets don't have to live in the file.
+
+    :param config: Flask app.config holding the single-tenant settings
+    :raises TenantConfigError: If a tenant is misconfigured, so the app fails at startup
+    """
+    global default_tenant
+
+    max_concurrency = int(os.getenv("TENANT_MAX_CONCURRENT_RUNS", DEFAULT_MAX_CONCURRENCY))
+
+    default_tenant = Tenant(
+        "default",
+        config.get("PHONE_NUMBER_ID"),
+        config.get("ACCESS_TOKEN"),
+        config.get("APP_SECRET"),
+        version=config.get("VERSION") or "v18.0",
+        verify_token=config.get("VERIFY_TOKEN"),
+        assistant_id=os.getenv("OPENAI_ASSISTANT_ID"),
+        # Keep existing conversations where they are
+        thread_store="threads_db",
+        max_concurrency=max_concurrency,
+    )
+    tenants_by_phone_number_id.clear()
+    if default_tenant.phone_number_id:
+        default_tenant.validate()
+        tenants_by_phone_number_id[default_tenant.phone_number_id] = default_tenant
+
+    path = config.get("TENANTS_FILE")
+    if not path:
+        return
+    with open(path, "r", encoding="utf-8") as fileobj:
+        entries = json.load(fileobj)["tenants"]
+    for entry in entries:
+        entry = expand_entry(entry)
+        entry.setdefault("max_concurrency", max_concurrency)
+        tenant = Tenant(**entry)
+        tenant.validate()
+        tenants_by_phone_number_id[tenant.phone_number_id] = tenant
+    logging.info(f"Loaded {len(entries)} tenants from {path}")
+
+
+def phone_number_id_for_body(body):
+    """
+    Business phone number a webhook body was sent to
+
+    :param body: Webhook request body
+    :return: metadata.phone_number_id, or None if the body has none
+    """
+    try:
+        return body["entry"][0]["changes"][0]["value"]["metadata"]["phone_number_id"]
+    except (KeyError, IndexError, TypeError):
+        return None
+
+
+def tenant_for_body(body):
+    """
+    Route a webhook body to its tenant by metadata.phone_number_id
+
+    :param body: Webhook request body
+    :return: Matching tenant, the default tenant if none matches and it has a number
+        configured, or None
+    """
+    # An unconfigured default has no app secret to verify the body with
+    fallback = default_tenant if default_tenant is not None and default_tenant.phone_number_id else None
+    return tenants_by_phone_number_id.get(phone_number_id_for_body(body), fallback)
+
+
+def current_tenant():
+    """
+    Tenant whose message is being handled in this context
+
+    :return: Tenant, falling back to the default tenant
+    """
+    return _current_tenant.get() or default_tenant
+
+
+@contextmanager
+def use_tenant(tenant):
+    """
+    Make a tenant current for the duration of the block
+
+    :param tenant: Tenant to activate
+    """
+    token = _current_tenant.set(tenant)
+    try:
+        yield tenant
+    finally:
+        _current_tenant.reset(token)
+
+
+def all_tenants():
+    tenants = list(tenants_by_phone_number_id.values())
+    if default_tenant is not None and default_tenant not in tenants:
+        tenants.append(default_tenant)
+    return tenants
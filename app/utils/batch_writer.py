@@ -0,0 +1,82 @@
+import queue
+import time
+import logging
+import threading
+
+
+class BatchWriter:
+    """
+    Collect records on a bounded queue and hand them to a flush callback in micro-batches
+
+    submit() never blocks: when the queue is full the record is dropped and
+    counted, so a burst of writes can't slow down the request path.
+    """
+
+    def __init__(self, name, flush, max_batch=500, interval=0.5, max_queue=50000):
+        """
+        :param name: Name used for the writer thread and in logs
+        :param flush: Callable receiving a list of records, run on the writer thread
+        :param max_batch: Flush once this many records are buffered
+        :param interval: Flush at least this often (seconds) while records are pending
+        :param max_queue: Records buffered before new ones are dropped
+        """
+        self.name = name
+        self.flush = flush
+        self.max_batch = max_batch
+        self.interval = interval
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self.thread.start()
+
+    def submit(self, record):
+        """
+        Queue a record for writing
+
+        :param record: Record passed through to the flush callback
+        :return: False if the record was dropped
+        """
+        if self.thread is None:
+            self.start()
+        try:
+            self.queue.put_nowait(record)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self.flush(batch)
+                self.written += len(batch)
+                self.batches += 1
+            except Exception as e:
+                logging.error(f"{self.name}: failed to write {len(batch)} records: {e}")
+                self.dropped += len(batch)
+
+    def stats(self):
+        return {
+            "written": self.written,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "pending": self.queue.qsize(),
+        }
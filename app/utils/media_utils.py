@@ -0,0 +1,178 @@
+import os
+import time
+import logging
+import mimetypes
+import tempfile
+import threading
+from dotenv import load_dotenv
+from app.tenants import current_tenant
+
+# Load environment variables
+load_dotenv()
+
+# Media handling limits
+MEDIA_MAX_BYTES = int(os.getenv("MEDIA_MAX_BYTES", str(20 * 1024 * 1024)))
+MEDIA_SPOOL_BYTES = int(os.getenv("MEDIA_SPOOL_BYTES", str(1024 * 1024)))
+MEDIA_CHUNK_BYTES = int(os.getenv("MEDIA_CHUNK_BYTES", str(64 * 1024)))
+MEDIA_MAX_CONCURRENT_DOWNLOADS = int(os.getenv("MEDIA_MAX_CONCURRENT_DOWNLOADS", "4"))
+
+MEDIA_MESSAGE_TYPES = ("image", "document", "audio", "video", "sticker")
+
+# File types the assistant's retrieval tool can read; anything else is described in text
+RETRIEVAL_MIME_TYPES = {
+    "application/pdf",
+    "application/json",
+    "application/msword",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "application/vnd.openxmlformats-officedocument.presentationml.presentation",
+    "text/plain",
+    "text/markdown",
+    "text/html",
+    "text/csv",
+}
+
+# Shared by all tenants so media can't crowd out the rest of the worker
+download_slots = threading.BoundedSemaphore(MEDIA_MAX_CONCURRENT_DOWNLOADS)
+
+
+class MediaTooLarge(Exception):
+    """
+    Raised when a media download exceeds MEDIA_MAX_BYTES
+    """
+
+
+class MediaDeadlineExceeded(Exception):
+    """
+    Raised when a media download cannot finish before the reply deadline
+    """
+
+
+def time_left(deadline, limit):
+    """
+    Timeout for the next step of a download, bounded by the reply deadline
+
+    :param deadline: Optional time.monotonic() value the download must finish by
+    :param limit: Longest timeout to use
+    :return: Seconds to wait, at most limit
+    :raises MediaDeadlineExceeded: If the deadline has already passed
+    """
+    if deadline is None:
+        return limit
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise MediaDeadlineExceeded("reply deadline passed")
+    return min(remaining, limit)
+
+
+def get_media_url(media_id, deadline=None):
+    """
+    Resolve a WhatsApp media ID to its short-lived download URL
+
+    :param media_id: Media ID from the webhook payload
+    :param deadline: Optional time.monotonic() value bounding the request
+    :return: Media metadata (url, mime_type, file_size)
+    """
+    tenant = current_tenant()
+    url = tenant.graph_url(media_id)
+    timeout = time_left(deadline, 10)
+    response = tenant.http.get(url, headers=tenant.auth_headers(), timeout=timeout)
+    response.raise_for_status()
+    return response.json()
+
+
+def stream_to_spooled_file(url, headers=None, max_bytes=MEDIA_MAX_BYTES, deadline=None):
+    """
+    Stream a download into a spooled temporary file without buffering it in memory
+
+    Small files stay in memory up to MEDIA_SPOOL_BYTES; larger ones roll over to disk.
+
+    :param url: URL to download
+    :param headers: Optional request headers
+    :param max_bytes: Size cap; larger downloads are aborted
+    :param deadline: Optional time.monotonic() value; the download is aborted when it passes
+    :return: Tuple of (file object positioned at 0, bytes downloaded)
+    :raises MediaTooLarge: If the download exceeds max_bytes
+    :raises MediaDeadlineExceeded: If the deadline passes while queued or downloading
+    """
+    http = current_tenant().http
+    spooled = tempfile.SpooledTemporaryFile(max_size=MEDIA_SPOOL_BYTES)
+    size = 0
+    try:
+        # Don't queue for a slot longer than the reply can wait
+        if not download_slots.acquire(timeout=time_left(deadline, threading.TIMEOUT_MAX)):
+            raise MediaDeadlineExceeded("no download slot before the reply deadline")
+        try:
+            timeout = time_left(deadline, 30)
+            with http.get(url, headers=headers, stream=True, timeout=timeout) as response:
+                response.raise_for_status()
+                declared = int(response.headers.get("Content-Length") or 0)
+                if declared > max_bytes:
+                    raise MediaTooLarge(f"{declared} bytes exceeds {max_bytes}")
+                for chunk in response.iter_content(chunk_size=MEDIA_CHUNK_BYTES):
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise MediaTooLarge(f"more than {max_bytes} bytes")
+                    spooled.write(chunk)
+                    # The read timeout only bounds each chunk, not the whole body
+                    if deadline is not None and time.monotonic() > deadline:
+                        raise MediaDeadlineExceeded(f"reply deadline passed after {size} bytes")
+        finally:
+            download_slots.release()
+    except Exception:
+        spooled.close()
+        raise
+    spooled.seek(0)
+    return spooled, size
+
+
+def download_media(media, deadline=None):
+    """
+    Download the media referenced by a WhatsApp message
+
+    :param media: Media object from the message (e.g. message["image"])
+    :param deadline: Optional time.monotonic() value bounding the download
+    :return: Tuple of (file object, filename)
+    """
+    metadata = get_media_url(media["id"], deadline)
+    mime_type = media.get("mime_type") or metadata.get("mime_type", "")
+    filename = media.get("filename") or (
+        f"{media['id']}{mimetypes.guess_extension(mime_type.split(';')[0]) or ''}"
+    )
+
+    if int(metadata.get("file_size") or 0) > MEDIA_MAX_BYTES:
+        raise MediaTooLarge(f"{metadata['file_size']} bytes exceeds {MEDIA_MAX_BYTES}")
+
+    start = time.perf_counter()
+    headers = current_tenant().auth_headers()
+    fileobj, size = stream_to_spooled_file(metadata["url"], headers=headers, deadline=deadline)
+    elapsed = time.perf_counter() - start
+    logging.info(
+        f"Downloaded {filename}: {size} bytes in {elapsed:.2f}s "
+        f"({size / max(elapsed, 1e-6) / 1024:.0f} KiB/s)"
+    )
+    return fileobj, filename
+
+
+def media_mime_type(media):
+    """
+    MIME type of a media attachment without its parameters ("audio/ogg; codecs=opus" -> "audio/ogg")
+
+    :param media: Media object from the message
+    :return: Lower-case MIME type, or an empty string if unknown
+    """
+    return (media.get("mime_type") or "").split(";")[0].strip().lower()
+
+
+def describe_location(location):
+    """
+    Turn a shared location into text the assistant can read
+
+    :param location: Location object from the message
+    :return: Text description of the location
+    """
+    parts = [
+        location.get("name"),
+        location.get("address"),
+        f"({location.get('latitude')}, {location.get('longitude')})",
+    ]
+    return "Shared location: " + ", ".join(part for part in parts if part)
@@ -0,0 +1,108 @@
+import os
+import sys
+import time
+import signal
+import logging
+import threading
+from collections import Counter
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+PROFILE_SIGNAL_SECONDS = float(os.getenv("PROFILE_SIGNAL_SECONDS", "10"))
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000
+# Shorter intervals turn the sampler into a busy loop
+PROFILE_MIN_INTERVAL = 0.001
+
+# Only one profile at a time; nothing runs (and nothing costs) while idle
+_profile_lock = threading.Lock()
+
+
+class ProfilerBusy(Exception):
+    """
+    Raised when a profile is requested while another one is running
+    """
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+def sample_stacks(seconds, interval=PROFILE_INTERVAL):
+    """
+    Sample the stacks of every other thread in this process
+
+    :param seconds: How long to sample for
+    :param interval: Seconds between samples, at least PROFILE_MIN_INTERVAL and at most seconds
+    :return: Counter of collapsed stacks ("root;...;leaf") to sample counts
+    :raises ProfilerBusy: If another profile is already running
+    """
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfilerBusy("A profile is already running")
+    try:
+        seconds = min(seconds, PROFILE_MAX_SECONDS)
+        # A huge interval would otherwise hold the profile lock long after the deadline
+        interval = min(max(interval, PROFILE_MIN_INTERVAL), seconds)
+        own_id = threading.get_ident()
+        names = {}
+        stacks = Counter()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                if thread_id not in names:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame))
+                    frame = frame.f_back
+                labels.append(names.get(thread_id, str(thread_id)))
+                stacks[";".join(reversed(labels))] += 1
+            time.sleep(max(0, min(interval, deadline - time.monotonic())))
+        return stacks
+    finally:
+        _profile_lock.release()
+
+
+def format_collapsed(stacks):
+    """
+    Format sampled stacks in the collapsed format read by flamegraph.pl and speedscope
+
+    :param stacks: Counter returned by sample_stacks
+    :return: One "stack count" line per distinct stack
+    """
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+def install_profile_signal(directory="."):
+    """
+    Profile the process for PROFILE_SIGNAL_SECONDS on SIGUSR2, writing a .folded file
+
+    :param directory: Where to write the output
+    """
+    if not hasattr(signal, "SIGUSR2"):
+        return
+
+    def run_profile():
+        try:
+            stacks = sample_stacks(PROFILE_SIGNAL_SECONDS)
+        except ProfilerBusy as e:
+            logging.warning(str(e))
+            return
+        path = os.path.join(directory, f"profile-{os.getpid()}-{int(time.time())}.folded")
+        with open(path, "w", encoding="utf-8") as fileobj:
+            fileobj.write(format_collapsed(stacks))
+        logging.info(f"Wrote profile to {path}")
+
+    def handle_sigusr2(signum, frame):
+        threading.Thread(target=run_profile, name="profiler", daemon=True).start()
+
+    try:
+        signal.signal(signal.SIGUSR2, handle_sigusr2)
+    except ValueError:
+        # Not in the main thread
+        pass
@@ -0,0 +1,37 @@
+import sqlite3
+import threading
+
+
+class SQLiteStore:
+    """
+    Lazily created per-thread SQLite connections to one database file
+    """
+
+    def __init__(self, path, schema):
+        """
+        :param path: Database file path
+        :param schema: SQL script creating the tables (must be idempotent)
+        """
+        self.path = path
+        self.schema = schema
+        self.local = threading.local()
+        self.schema_lock = threading.Lock()
+        self.schema_ready = False
+
+    def connection(self):
+        """
+        Connection owned by the calling thread
+
+        :return: sqlite3 connection
+        """
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            with self.schema_lock:
+                if not self.schema_ready:
+                    connection.executescript(self.schema)
+                    self.schema_ready = True
+            self.local.connection = connection
+        return connection
@@ -0,0 +1,183 @@
+import os
+import json
+import heapq
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# WhatsApp drops the typing indicator after 25 seconds, so refresh it before that
+TYPING_REFRESH_SECONDS = float(os.getenv("TYPING_REFRESH_SECONDS", "20"))
+TYPING_MAX_WORKERS = int(os.getenv("TYPING_MAX_WORKERS", "4"))
+
+executor = ThreadPoolExecutor(max_workers=TYPING_MAX_WORKERS, thread_name_prefix="typing")
+
+_latencies = {"read_receipt": deque(maxlen=1000), "reply": deque(maxlen=1000)}
+_latencies_lock = threading.Lock()
+
+
+def get_read_typing_input(message_id, typing=True):
+    """
+    Prepare JSON payload marking a message as read and showing the typing indicator
+
+    :param message_id: ID of the inbound message
+    :param typing: Whether to show the typing indicator along with the read receipt
+    :return: JSON-formatted payload
+    """
+    payload = {
+        "messaging_product": "whatsapp",
+        "status": "read",
+        "message_id": message_id,
+    }
+    if typing:
+        payload["typing_indicator"] = {"type": "text"}
+    return json.dumps(payload)
+
+
+def send_read_and_typing(tenant, message_id, typing=True):
+    """
+    Mark a message as read and (re)start the typing indicator
+
+    :param tenant: Tenant that received the message
+    :param message_id: ID of the inbound message
+    :param typing: Whether to show the typing indicator along with the read receipt
+    :return: True if the Graph API accepted the request
+    """
+    headers = {"Content-type": "application/json", **tenant.auth_headers()}
+    url = tenant.graph_url(f"{tenant.phone_number_id}/messages")
+    try:
+        response = tenant.http.post(
+            url, data=get_read_typing_input(message_id, typing), headers=headers, timeout=5
+        )
+        response.raise_for_status()
+        return True
+    except requests.RequestException as e:
+        logging.warning(f"Failed to send typing indicator for {message_id}: {e}")
+        return False
+
+
+def record_latency(kind, seconds):
+    with _latencies_lock:
+        _latencies[kind].append(seconds)
+
+
+def get_latency_stats():
+    """
+    Perceived (read receipt shown) and actual (reply sent) latency since acceptance
+
+    :return: Percentiles in seconds over the most recent messages
+    """
+    stats = {}
+    with _latencies_lock:
+        samples = {kind: sorted(values) for kind, values in _latencies.items()}
+    for kind, values in samples.items():
+        if values:
+            stats[kind] = {
+                "count": len(values),
+                "p50": round(values[len(values) // 2], 3),
+                "p95": round(values[min(len(values) - 1, int(len(values) * 0.95))], 3),
+            }
+    return stats
+
+
+class TypingRefresher:
+    """
+    Single background thread re-sending typing indicators for long-running replies
+    """
+
+    def __init__(self, interval=TYPING_REFRESH_SECONDS):
+        self.interval = interval
+        self.active = {}
+        self.schedule = []
+        self.condition = threading.Condition()
+        self.thread = None
+
+    def add(self, tenant, message_id):
+        with self.condition:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="typing-refresher", daemon=True)
+                self.thread.start()
+            self.active[message_id] = tenant
+            heapq.heappush(self.schedule, (time.monotonic() + self.interval, message_id))
+            self.condition.notify()
+
+    def remove(self, message_id):
+        with self.condition:
+            self.active.pop(message_id, None)
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.schedule:
+                    self.condition.wait()
+                due, message_id = self.schedule[0]
+                wait = due - time.monotonic()
+                if wait > 0:
+                    self.condition.wait(wait)
+                    continue
+                heapq.heappop(self.schedule)
+                tenant = self.active.get(message_id)
+                if tenant is None:
+                    continue
+                heapq.heappush(self.schedule, (due + self.interval, message_id))
+            executor.submit(self._refresh, tenant, message_id)
+
+    def _refresh(self, tenant, message_id):
+        # The reply may have gone out while this refresh was queued
+        if message_id in self.active:
+            send_read_and_typing(tenant, message_id)
+
+
+refresher = TypingRefresher()
+
+
+class TypingIndicator:
+    """
+    Context manager showing read receipt and typing indicator while a reply is generated
+
+    Sends happen on a background pool so they never sit on the reply's critical path.
+    Only enter it once the message is going to be answered.
+    """
+
+    def __init__(self, tenant, message_id, accepted, typing=True):
+        """
+        :param tenant: Tenant that received the message
+        :param message_id: ID of the inbound message
+        :param accepted: time.monotonic() when the message was accepted
+        :param typing: False to only send the read receipt, for replies that are ready at once
+        """
+        self.tenant = tenant
+        self.message_id = message_id
+        self.accepted = accepted
+        self.typing = typing
+        self.stopped = False
+
+    def _first_send(self):
+        # If the reply beat this send out of the pool, "typing" would outlive it
+        typing = self.typing and not self.stopped
+        if send_read_and_typing(self.tenant, self.message_id, typing):
+            record_latency("read_receipt", time.monotonic() - self.accepted)
+
+    def stop(self):
+        """
+        Stop refreshing the indicator, e.g. just before the reply is sent
+        """
+        self.stopped = True
+        if self.message_id:
+            refresher.remove(self.message_id)
+
+    def __enter__(self):
+        if self.message_id:
+            executor.submit(self._first_send)
+            if self.typing:
+                refresher.add(self.tenant, self.message_id)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -1,9 +1,35 @@
 import logging
 import json
 import re
+import time
 import requests
-from flask import current_app, jsonify
-from app.services.openai_service import generate_response
+from flask import jsonify
+from app.services.openai_service import (
+    RUN_DEADLINE_SECONDS,
+    delete_files,
+    generate_response,
+    transcribe_fileobj,
+    upload_fileobj,
+)
+from app.services.admission import (
+    admission,
+    AdmissionRejected,
+    OVERLOAD_REPLY,
+    SENDER_RATE_REPLY,
+)
+from app.services.journal import journal
+from app.services.intent_router import OFFICE_INFO, fast_path_reply, record_model_latency
+from app.tenants import current_tenant, tenant_for_body, use_tenant
+from app.utils.typing_indicator import TypingIndicator, record_latency
+from app.utils.media_utils import (
+    MEDIA_MESSAGE_TYPES,
+    RETRIEVAL_MIME_TYPES,
+    MediaDeadlineExceeded,
+    MediaTooLarge,
+    describe_location,
+    download_media,
+    media_mime_type,
+)
 
 def log_http_response(response):
     """
@@ -38,15 +64,12 @@ def send_message(data):
     :param data: Prepared message data
     :return: HTTP response or error
     """
-    headers = {
-        "Content-type": "application/json",
-        "Authorization": f"Bearer {current_app.config['ACCESS_TOKEN']}",
-    }
-
-    url = f"https://graph.facebook.com/{current_app.config['VERSION']}/{current_app.config['PHONE_NUMBER_ID']}/messages"
+    tenant = current_tenant()
+    headers = {"Content-type": "application/json", **tenant.auth_headers()}
+    url = tenant.graph_url(f"{tenant.phone_number_id}/messages")
 
     try:
-        response = requests.post(url, data=data, headers=headers, timeout=10)
+        response = tenant.http.post(url, data=data, headers=headers, timeout=10)
         response.raise_for_status()
     except requests.Timeout:
         logging.error("Timeout occurred while sending message")
@@ -73,29 +96,185 @@ def process_text_for_whatsapp(text):
 
     return text
 
+def fetch_media(media, deadline=None):
+    """
+    Download a WhatsApp media attachment, logging instead of raising on failure
+    
+    :param media: Media object from the message
+    :param deadline: Optional time.monotonic() value bounding the download
+    :return: Tuple of (file object, filename), or (None, None) if the download failed
+    """
+    try:
+        return download_media(media, deadline)
+    except MediaTooLarge as e:
+        logging.warning(f"Media {media.get('id')} rejected: {e}")
+    except MediaDeadlineExceeded as e:
+        logging.warning(f"Media {media.get('id')} abandoned: {e}")
+    except requests.RequestException as e:
+        logging.error(f"Media download failed: {e}")
+    return None, None
+
+def forward_media(media, deadline=None):
+    """
+    Stream a WhatsApp media attachment to the assistant's file storage
+    
+    :param media: Media object from the message
+    :param deadline: Optional time.monotonic() value bounding the upload
+    :return: Uploaded file ID, or None if the media could not be forwarded
+    """
+    fileobj, filename = fetch_media(media, deadline)
+    if fileobj is None:
+        return None
+    with fileobj:
+        file = upload_fileobj(fileobj, filename, deadline)
+    return file.id if file else None
+
+def transcribe_media(media, deadline=None):
+    """
+    Transcribe a WhatsApp voice note or audio attachment
+    
+    :param media: Media object from the message
+    :param deadline: Optional time.monotonic() value bounding the transcription
+    :return: Transcript text, or None if the audio could not be transcribed
+    """
+    fileobj, filename = fetch_media(media, deadline)
+    if fileobj is None:
+        return None
+    with fileobj:
+        return transcribe_fileobj(fileobj, filename, deadline)
+
+def attach_media(message_body, media, deadline=None):
+    """
+    Turn a media attachment into something the assistant can read
+    
+    Documents the retrieval tool supports are uploaded, audio is transcribed into
+    the message, and anything else is described in text without downloading it.
+    
+    :param message_body: Caption or placeholder text for the attachment
+    :param media: Media object from the message
+    :param deadline: Optional time.monotonic() value bounding the OpenAI calls
+    :return: Tuple of (message text, uploaded file IDs)
+    """
+    mime_type = media_mime_type(media)
+    if mime_type.startswith("audio/"):
+        transcript = transcribe_media(media, deadline)
+        if transcript is None:
+            return message_body + " (The voice message could not be transcribed.)", []
+        return f"{message_body}\nTranscript of the voice message: {transcript}", []
+    if mime_type not in RETRIEVAL_MIME_TYPES:
+        logging.info(f"Not forwarding unsupported attachment type: {mime_type or 'unknown'}")
+        return (
+            message_body + f" (The attachment is a {mime_type or 'file of unknown type'}, "
+            "which cannot be read. Ask the user to describe it in text.)"
+        ), []
+    file_id = forward_media(media, deadline)
+    if file_id is None:
+        return message_body + " (The attachment could not be processed.)", []
+    return message_body, [file_id]
+
 def process_whatsapp_message(body):
     """
-    Process incoming WhatsApp message
+    Process incoming WhatsApp message on behalf of the tenant owning the receiving number
+    
+    :param body: Webhook request body
+    """
+    accepted = time.monotonic()
+
+    tenant = tenant_for_body(body)
+    if tenant is None:
+        # Only reachable on replay, after the tenant was removed from the config
+        message_id = body["entry"][0]["changes"][0]["value"]["messages"][0].get("id")
+        logging.warning(f"Dropping message {message_id} for a phone number no tenant serves")
+        journal.complete(message_id)
+        return
+
+    with use_tenant(tenant) as tenant:
+        reply_to_message(body, tenant, accepted)
+
+def reply_to_message(body, tenant, accepted):
+    """
+    Generate and send the reply to an incoming WhatsApp message
     
     :param body: Webhook request body
+    :param tenant: Tenant the message was sent to
+    :param accepted: time.monotonic() when the message was accepted
     """
+    # The reply deadline starts as soon as the message is accepted
+    deadline = accepted + RUN_DEADLINE_SECONDS
+
     # Extract sender details
     wa_id = body["entry"][0]["changes"][0]["value"]["contacts"][0]["wa_id"]
     name = body["entry"][0]["changes"][0]["value"]["contacts"][0]["profile"]["name"]
 
     # Get the message body
     message = body["entry"][0]["changes"][0]["value"]["messages"][0]
-    message_body = message["text"]["body"]
+    message_id = message.get("id")
+    message_type = message.get("type", "text")
+    media = None
+
+    if message_type == "text":
+        message_body = message["text"]["body"]
+    elif message_type == "location":
+        message_body = describe_location(message["location"])
+    elif message_type in MEDIA_MESSAGE_TYPES:
+        media = message[message_type]
+        message_body = media.get("caption") or f"The user sent a {message_type}."
+    else:
+        logging.info(f"Ignoring unsupported message type: {message_type}")
+        journal.complete(message_id)
+        return
+
+    # Answer static office-information questions without a model run
+    fast_reply = None
+    if message_type == "text":
+        office_info = OFFICE_INFO if tenant.name == "default" else tenant.office_info
+        fast_reply = fast_path_reply(message_body, office_info)
+
+    if fast_reply is None:
+        try:
+            admission.check_sender(wa_id, tenant)
+        except AdmissionRejected as e:
+            if not e.notify:
+                # Already told to slow down; don't answer (or even mark as read) the rest
+                journal.complete(message_id)
+                return
+            fast_reply = SENDER_RATE_REPLY
 
-    # Generate AI response
-    response = generate_response(message_body, wa_id, name)
+    # Every message past this point is answered; show that we're on it. Canned
+    # replies go out at once, so they only get the read receipt.
+    with TypingIndicator(tenant, message_id, accepted, typing=fast_reply is None) as typing:
+        if fast_reply is not None:
+            processed_response = fast_reply
+        else:
+            # Generate AI response, shedding load when over capacity
+            try:
+                with admission.admit(wa_id, tenant, check_sender=False):
+                    # Only admitted messages cost a download and upload
+                    file_ids = []
+                    if media is not None:
+                        message_body, file_ids = attach_media(message_body, media, deadline)
+                    started = time.perf_counter()
+                    try:
+                        response = generate_response(
+                            message_body, wa_id, name, file_ids=file_ids, deadline=deadline
+                        )
+                    finally:
+                        # The run has read the attachments, don't keep them in storage
+                        delete_files(file_ids)
+                    record_model_latency(time.perf_counter() - started)
+                processed_response = process_text_for_whatsapp(response)
+            except AdmissionRejected:
+                processed_response = OVERLOAD_REPLY
 
-    # Format response for WhatsApp
-    processed_response = process_text_for_whatsapp(response)
+        # Send response back to sender
+        data = get_text_message_input(wa_id, processed_response)
+        typing.stop()  # A late refresh would re-show "typing" after the reply
+        response = send_message(data)
 
-    # Send response back to sender
-    data = get_text_message_input(wa_id, processed_response)
-    send_message(data)
+        # Unanswered messages stay open in the journal and are replayed on restart
+        if isinstance(response, requests.Response):
+            journal.complete(message_id)
+            record_latency("reply", time.monotonic() - accepted)
 
 def is_valid_whatsapp_message(body):
     """
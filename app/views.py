@@ -1,7 +1,25 @@
 import logging
 import json
-from flask import Blueprint, request, jsonify, current_app
-from .decorators.security import signature_required
+import math
+from flask import Blueprint, request, jsonify, Response
+from .decorators.security import signature_required, admin_required
+from .decorators.timing import request_timing
+from .utils.profiling import (
+    PROFILE_INTERVAL,
+    PROFILE_MIN_INTERVAL,
+    ProfilerBusy,
+    format_collapsed,
+    sample_stacks,
+)
+from .services.admission import admission
+from .services.status_store import record_statuses, status_report
+from .services.usage_store import usage_report
+from .services.journal import journal, JournalError
+from .services.openai_service import get_run_stats
+from .services.tools import get_tool_stats
+from .services.intent_router import get_intent_stats
+from .tenants import all_tenants
+from .utils.typing_indicator import get_latency_stats
 from .utils.whatsapp_utils import (
     process_whatsapp_message,
     is_valid_whatsapp_message,
@@ -20,21 +38,42 @@ def handle_message():
     :return: JSON response and HTTP status code
     """
     body = request.get_json()
-    logging.info(f"Received request body: {body}")
 
-    # Check for WhatsApp status update
+    # Check for WhatsApp status update; these are queued for the analytics store
     if (
         body.get("entry", [{}])[0]
         .get("changes", [{}])[0]
         .get("value", {})
         .get("statuses")
     ):
-        logging.info("Received a WhatsApp status update.")
+        record_statuses(body)
         return jsonify({"status": "ok"}), 200
 
+    logging.info(f"Received request body: {body}")
+
     try:
         if is_valid_whatsapp_message(body):
-            process_whatsapp_message(body)
+            # Ask Meta to redeliver to another worker while we shut down
+            if journal.closing:
+                return jsonify({"status": "error", "message": "Shutting down"}), 503
+
+            message_id = body["entry"][0]["changes"][0]["value"]["messages"][0].get("id")
+            try:
+                accepted = journal.accept(message_id, body)
+            except JournalError as e:
+                logging.error(f"Could not journal message {message_id}: {e}")
+                return jsonify({"status": "error", "message": "Journal unavailable"}), 503
+            if not accepted:
+                logging.info(f"Ignoring redelivered message {message_id}")
+                return jsonify({"status": "ok"}), 200
+
+            with journal.track():
+                try:
+                    process_whatsapp_message(body)
+                except Exception:
+                    # Answer 500 and let Meta's redelivery retry the message
+                    journal.forget(message_id)
+                    raise
             return jsonify({"status": "ok"}), 200
         else:
             return (
@@ -56,7 +95,8 @@ def verify():
     challenge = request.args.get("hub.challenge")
 
     if mode and token:
-        if mode == "subscribe" and token == current_app.config["VERIFY_TOKEN"]:
+        verify_tokens = {tenant.verify_token for tenant in all_tenants()} - {None}
+        if mode == "subscribe" and token in verify_tokens:
             logging.info("WEBHOOK_VERIFIED")
             return challenge, 200
         else:
@@ -72,6 +112,57 @@ def webhook_get():
     return verify()
 
 @webhook_blueprint.route("/webhook", methods=["POST"])
+@request_timing
 @signature_required
 def webhook_post():
-    return handle_message()
\ No newline at end of file
+    return handle_message()
+
+@webhook_blueprint.route("/admin/stats", methods=["GET"])
+@admin_required
+def admin_stats():
+    return (
+        jsonify(
+            {
+                "admission": admission.stats(),
+                "journal": journal.stats(),
+                "runs": get_run_stats(),
+                "tools": get_tool_stats(),
+                "fast_path": get_intent_stats(),
+                "latency": get_latency_stats(),
+            }
+        ),
+        200,
+    )
+
+
+@webhook_blueprint.route("/admin/statuses", methods=["GET"])
+@admin_required
+def admin_statuses():
+    since = request.args.get("since", default=86400, type=int)
+    return jsonify(status_report(since)), 200
+
+
+@webhook_blueprint.route("/admin/usage", methods=["GET"])
+@admin_required
+def admin_usage():
+    since = request.args.get("since", default=86400, type=int)
+    limit = request.args.get("limit", default=10, type=int)
+    return jsonify(usage_report(since, limit)), 200
+
+
+@webhook_blueprint.route("/admin/profile", methods=["GET"])
+@admin_required
+def admin_profile():
+    seconds = request.args.get("seconds", default=10, type=float)
+    interval = request.args.get("interval_ms", default=PROFILE_INTERVAL * 1000, type=float) / 1000
+    if not (interval >= PROFILE_MIN_INTERVAL and math.isfinite(interval)):
+        # Also rejects NaN and infinity
+        return jsonify({
+            "status": "error",
+            "message": f"interval_ms must be a number of at least {PROFILE_MIN_INTERVAL * 1000:g}",
+        }), 400
+    try:
+        stacks = sample_stacks(seconds, interval)
+    except ProfilerBusy as e:
+        return jsonify({"status": "error", "message": str(e)}), 409
+    return Response(format_collapsed(stacks), mimetype="text/plain")
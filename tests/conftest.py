@@ -0,0 +1,12 @@
+import os
+import tempfile
+
+# App modules read their settings at import time, so point them somewhere
+# disposable before any test imports them
+_tmp = tempfile.mkdtemp(prefix="whatsapp-bot-tests-")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("STATUS_DB_PATH", os.path.join(_tmp, "statuses.db"))
+os.environ.setdefault("USAGE_DB_PATH", os.path.join(_tmp, "usage.db"))
+os.environ.setdefault("JOURNAL_PATH", os.path.join(_tmp, "journal.log"))
+os.environ.setdefault("KB_MANIFEST_PATH", os.path.join(_tmp, "kb_manifest.json"))
+os.environ.setdefault("ADMIN_TOKEN", "test-admin-token")
@@ -0,0 +1,145 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.services.admission import AdmissionController, AdmissionRejected, TokenBucket
+from app.tenants import Tenant
+
+
+def test_token_bucket_takes_only_what_it_has():
+    bucket = TokenBucket(capacity=3, refill_per_second=0)
+    assert bucket.try_acquire(2)
+    assert not bucket.try_acquire(2)
+    assert bucket.try_acquire(1)
+    assert bucket.level() == 0
+
+
+def test_token_bucket_refills_up_to_capacity():
+    bucket = TokenBucket(capacity=10, refill_per_second=1000)
+    bucket.consume(10)
+    time.sleep(0.05)
+    assert bucket.level() == 10
+
+
+def test_token_bucket_consume_can_go_into_debt():
+    bucket = TokenBucket(capacity=5, refill_per_second=0)
+    bucket.consume(8)
+    assert bucket.level() == -3
+    assert not bucket.try_acquire(1)
+
+
+def _controller(**overrides):
+    settings = dict(
+        max_concurrent=40,
+        max_queued=40,
+        queue_timeout=1,
+        tokens_per_minute=3000,
+        estimated_tokens=2000,
+        sender_per_minute=60,
+        sender_burst=5,
+    )
+    settings.update(overrides)
+    return AdmissionController(**settings)
+
+
+def test_spike_is_limited_by_token_budget():
+    controller = _controller()
+    release = threading.Event()
+    admitted = []
+
+    def request(i):
+        try:
+            with controller.admit(f"sender-{i}"):
+                admitted.append(i)
+                release.wait(2)
+        except AdmissionRejected as e:
+            return e.reason
+
+    with ThreadPoolExecutor(max_workers=40) as pool:
+        futures = [pool.submit(request, i) for i in range(40)]
+        time.sleep(0.2)
+        release.set()
+        reasons = [future.result() for future in futures]
+
+    # 3000 tokens only cover one run estimated at 2000
+    assert len(admitted) == 1
+    assert reasons.count("token_budget") == 39
+    assert controller.stats()["shed_token_budget"] == 39
+
+
+def test_usage_settles_against_reservation():
+    controller = _controller(tokens_per_minute=10000, estimated_tokens=2000)
+    with controller.admit("sender"):
+        assert controller.token_bucket.level() == pytest.approx(8000, abs=5)
+        controller.record_usage(500)
+        assert controller.token_bucket.level() == pytest.approx(9500, abs=5)
+
+
+def test_run_without_usage_keeps_its_reservation():
+    controller = _controller(tokens_per_minute=10000, estimated_tokens=2000)
+    with controller.admit("sender"):
+        pass
+    assert controller.token_bucket.level() == pytest.approx(8000, abs=5)
+
+
+def test_rejected_request_returns_its_reservation():
+    controller = _controller(max_concurrent=1, max_queued=0, tokens_per_minute=10000)
+    with controller.admit("first"):
+        with pytest.raises(AdmissionRejected) as rejected:
+            with controller.admit("second"):
+                pass
+        assert rejected.value.reason == "queue_full"
+        assert controller.token_bucket.level() == pytest.approx(8000, abs=5)
+
+
+def test_budget_is_rechecked_after_queue_wait():
+    controller = _controller(max_concurrent=1, tokens_per_minute=10000, estimated_tokens=2000)
+    outcome = {}
+
+    def waiter():
+        try:
+            with controller.admit("waiter"):
+                outcome["admitted"] = True
+        except AdmissionRejected as e:
+            outcome["reason"] = e.reason
+
+    with controller.admit("first"):
+        thread = threading.Thread(target=waiter)
+        thread.start()
+        time.sleep(0.1)
+        # The running request turns out far more expensive than estimated
+        controller.record_usage(12000)
+    thread.join()
+
+    assert outcome == {"reason": "token_budget"}
+
+
+def test_sender_rate_limit_is_per_tenant_and_sender():
+    controller = _controller(sender_burst=1, sender_per_minute=1, tokens_per_minute=100000)
+    brand_a = Tenant("brand_a", "1001", "token", "secret")
+    brand_b = Tenant("brand_b", "1002", "token", "secret")
+    with controller.admit("sender", brand_a):
+        pass
+    with pytest.raises(AdmissionRejected) as rejected:
+        with controller.admit("sender", brand_a):
+            pass
+    assert rejected.value.reason == "sender_rate"
+
+    # The same number writing to another brand, and other senders, have their own limit
+    with controller.admit("sender", brand_b):
+        pass
+    with controller.admit("other", brand_a):
+        pass
+
+
+def test_rate_limited_sender_is_notified_once_per_window():
+    controller = _controller(sender_burst=1, sender_per_minute=1)
+    controller.check_sender("sender")
+    notices = []
+    for _ in range(3):
+        with pytest.raises(AdmissionRejected) as rejected:
+            controller.check_sender("sender")
+        notices.append(rejected.value.notify)
+    assert notices == [True, False, False]
@@ -0,0 +1,164 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from app.services import broadcast as broadcast_module
+from app.services.broadcast import (
+    AsyncTokenBucket,
+    Checkpoint,
+    read_recipients,
+    send_with_retries,
+    validate_recipient,
+)
+
+
+def test_checkpoint_tracks_contiguous_prefix(tmp_path):
+    checkpoint = Checkpoint(str(tmp_path / "list.csv.checkpoint"))
+    checkpoint.mark(1, True)
+    checkpoint.mark(2, False)
+    assert checkpoint.next_line == 0
+    checkpoint.mark(0, True)
+    assert checkpoint.next_line == 3
+    assert (checkpoint.sent, checkpoint.failed) == (2, 1)
+
+
+def test_checkpoint_resumes_from_saved_state(tmp_path):
+    path = str(tmp_path / "list.csv.checkpoint")
+    checkpoint = Checkpoint(path)
+    for line_no in range(3):
+        checkpoint.mark(line_no, True)
+    checkpoint.mark(5, True)
+    checkpoint.save()
+
+    resumed = Checkpoint(path)
+    # Line 5 finished out of order and is remembered above the low-water mark
+    assert resumed.next_line == 3
+    assert resumed.done == {5}
+    assert resumed.sent == 4
+
+
+def test_gap_marks_do_not_count_as_sent_or_failed(tmp_path):
+    checkpoint = Checkpoint(str(tmp_path / "list.csv.checkpoint"))
+    checkpoint.mark(0)
+    assert checkpoint.next_line == 1
+    assert (checkpoint.sent, checkpoint.failed) == (0, 0)
+
+
+def test_async_token_bucket_paces_to_rate():
+    async def take(count):
+        bucket = AsyncTokenBucket(rate=100, burst=1)
+        start = time.monotonic()
+        for _ in range(count):
+            await bucket.acquire()
+        return time.monotonic() - start
+
+    elapsed = asyncio.run(take(21))
+    assert elapsed == pytest.approx(0.2, abs=0.08)
+
+
+@pytest.mark.parametrize(
+    "record, valid",
+    [
+        ({"wa_id": "33612345678"}, True),
+        ({"wa_id": "+33612345678", "parameters": ["Alice"]}, True),
+        ({"wa_id": ""}, False),
+        ({"name": "no wa_id"}, False),
+        ({"wa_id": "not a number"}, False),
+        ({"wa_id": "33612345678", "parameters": "Alice"}, False),
+        (None, False),
+    ],
+)
+def test_validate_recipient(record, valid):
+    assert (validate_recipient(record) is None) == valid
+
+
+def test_read_recipients_flags_malformed_jsonl(tmp_path):
+    path = tmp_path / "list.jsonl"
+    path.write_text('{"wa_id": "1"}\n\n{broken\n{"wa_id": "2"}\n', encoding="utf-8")
+    assert list(read_recipients(str(path))) == [(0, {"wa_id": "1"}), (2, None), (3, {"wa_id": "2"})]
+
+
+def test_read_recipients_splits_csv_parameters(tmp_path):
+    path = tmp_path / "list.csv"
+    path.write_text("wa_id,parameters\n331,Alice|12\n", encoding="utf-8")
+    assert list(read_recipients(str(path))) == [(0, {"wa_id": "331", "parameters": ["Alice", "12"]})]
+
+
+class FakeResponse:
+    def __init__(self, status):
+        self.status = status
+
+    async def text(self):
+        return ""
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+
+class FakeSession:
+    def __init__(self, statuses):
+        self.statuses = list(statuses)
+
+    def post(self, url, data):
+        return FakeResponse(self.statuses.pop(0))
+
+
+class CountingBucket:
+    def __init__(self):
+        self.acquired = 0
+
+    async def acquire(self):
+        self.acquired += 1
+
+
+def test_every_retry_takes_a_token(monkeypatch):
+    real_sleep = asyncio.sleep
+    monkeypatch.setattr(asyncio, "sleep", lambda delay: real_sleep(0))
+    bucket = CountingBucket()
+    session = FakeSession([429, 503, 200])
+    ok = asyncio.run(send_with_retries(session, "url", "{}", "331", bucket, max_retries=5))
+    assert ok
+    assert bucket.acquired == 3
+
+
+def test_bad_rows_are_failed_without_stopping_workers(monkeypatch, tmp_path):
+    path = tmp_path / "list.jsonl"
+    rows = [{"wa_id": "331"}, {"name": "missing"}, {"wa_id": "332"}, {"wa_id": "boom"}, {"wa_id": "333"}]
+    path.write_text("\n".join(json.dumps(row) for row in rows) + "\n", encoding="utf-8")
+
+    async def fake_send(session, url, data, recipient, bucket):
+        return True
+
+    monkeypatch.setattr(broadcast_module, "send_with_retries", fake_send)
+    report = asyncio.run(broadcast_module.broadcast(str(path), "hello", "fr", rate=1000, concurrency=1))
+
+    assert report["sent"] == 3
+    assert report["failed"] == 2
+    assert report["next_line"] == 5
+
+
+def test_resume_skips_lines_finished_out_of_order(monkeypatch, tmp_path):
+    path = tmp_path / "list.jsonl"
+    rows = [{"wa_id": f"33{i}"} for i in range(5)]
+    path.write_text("\n".join(json.dumps(row) for row in rows) + "\n", encoding="utf-8")
+    checkpoint = Checkpoint(f"{path}.checkpoint")
+    for line_no in (0, 1, 3):
+        checkpoint.mark(line_no, True)
+    checkpoint.save()
+    recipients = []
+
+    async def fake_send(session, url, data, recipient, bucket):
+        recipients.append(recipient)
+        return True
+
+    monkeypatch.setattr(broadcast_module, "send_with_retries", fake_send)
+    report = asyncio.run(broadcast_module.broadcast(str(path), "hello", "fr", rate=1000, concurrency=1))
+
+    assert recipients == ["332", "334"]
+    assert report["sent"] == 5
+    assert report["next_line"] == 5
@@ -0,0 +1,114 @@
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import ingestion
+
+
+class FakeClient:
+    def __init__(self):
+        self.deleted = []
+        self.attached = None
+        self.files = SimpleNamespace(delete=self.deleted.append)
+        self.beta = SimpleNamespace(
+            assistants=SimpleNamespace(update=self._update)
+        )
+
+    def _update(self, assistant_id, file_ids):
+        self.attached = file_ids
+
+
+_load_manifest = ingestion.load_manifest
+_save_manifest = ingestion.save_manifest
+
+
+@pytest.fixture
+def fake_openai(monkeypatch, tmp_path):
+    manifest_path = str(tmp_path / "kb_manifest.json")
+    monkeypatch.setattr(ingestion, "load_manifest", lambda: _load_manifest(manifest_path))
+    monkeypatch.setattr(
+        ingestion, "save_manifest", lambda manifest: _save_manifest(manifest, manifest_path)
+    )
+    uploads = iter(f"file-{i}" for i in range(100))
+    monkeypatch.setattr(ingestion, "upload_file", lambda path: SimpleNamespace(id=next(uploads)))
+    client = FakeClient()
+    monkeypatch.setattr(ingestion, "client", client)
+    return client
+
+
+def _write(directory, name, content):
+    with open(os.path.join(directory, name), "w", encoding="utf-8") as fileobj:
+        fileobj.write(content)
+
+
+def test_unchanged_documents_are_not_uploaded_again(fake_openai, tmp_path):
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    _write(docs, "a.txt", "alpha")
+    _write(docs, "b.md", "beta")
+
+    first = ingestion.ingest_directory(str(docs), assistant_id="asst")
+    second = ingestion.ingest_directory(str(docs), assistant_id="asst")
+
+    assert first["files_uploaded"] == 2
+    assert second["files_uploaded"] == 0
+    assert second["files_skipped"] == 2
+    assert fake_openai.attached == first["file_ids"]
+
+
+def test_changed_document_replaces_its_old_upload(fake_openai, tmp_path):
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    _write(docs, "bail.txt", "version 1")
+    first = ingestion.ingest_directory(str(docs), assistant_id="asst")
+
+    _write(docs, "bail.txt", "version 2")
+    second = ingestion.ingest_directory(str(docs), assistant_id="asst")
+
+    assert fake_openai.deleted == first["file_ids"]
+    assert second["files_deleted"] == first["file_ids"]
+    assert fake_openai.attached == second["file_ids"] != first["file_ids"]
+    assert len(_load_manifest(str(tmp_path / "kb_manifest.json"))["files"]) == 1
+
+
+def test_failed_replacement_keeps_the_old_upload_attached(fake_openai, tmp_path, monkeypatch):
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    _write(docs, "bail.txt", "version 1")
+    first = ingestion.ingest_directory(str(docs), assistant_id="asst")
+
+    _write(docs, "bail.txt", "version 2")
+    monkeypatch.setattr(ingestion, "upload_with_retries", lambda path: None)
+    second = ingestion.ingest_directory(str(docs), assistant_id="asst")
+
+    assert second["files_failed"] == [str(docs / "bail.txt")]
+    assert fake_openai.deleted == []
+    assert fake_openai.attached == second["file_ids"] == first["file_ids"]
+    assert len(_load_manifest(str(tmp_path / "kb_manifest.json"))["files"]) == 1
+
+
+def test_old_uploads_are_kept_without_an_assistant(fake_openai, tmp_path):
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    _write(docs, "bail.txt", "version 1")
+    ingestion.ingest_directory(str(docs), assistant_id=None)
+    _write(docs, "bail.txt", "version 2")
+    report = ingestion.ingest_directory(str(docs), assistant_id=None)
+
+    assert fake_openai.deleted == []
+    assert report["files_deleted"] == []
+
+
+def test_too_many_documents_is_reported_before_uploading(fake_openai, tmp_path, monkeypatch):
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    for i in range(ingestion.ASSISTANT_MAX_FILES + 1):
+        _write(docs, f"{i}.txt", f"document {i}")
+    monkeypatch.setattr(ingestion, "upload_file", pytest.fail)
+
+    report = ingestion.ingest_directory(str(docs), assistant_id="asst")
+
+    assert "error" in report
+    assert fake_openai.attached is None
+    assert not os.path.exists(tmp_path / "kb_manifest.json")
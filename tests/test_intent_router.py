@@ -0,0 +1,90 @@
+import pytest
+
+from app.services.intent_router import (
+    OFFICE_INFO,
+    KeywordAutomaton,
+    detect_intents,
+    fast_path_reply,
+    normalize,
+    render_answer,
+)
+
+
+def test_normalize_strips_accents_case_and_punctuation():
+    assert normalize("Où êtes-vous ?") == " ou etes vous "
+    assert normalize("أين مكتبكم") == " اين مكتبكم "
+
+
+def test_automaton_matches_on_word_boundaries_only():
+    automaton = KeywordAutomaton([("mail", "m"), ("adresse mail", "am"), ("tel", "t")])
+    matches = automaton.find(normalize("Mon adresse mail, hotel"))
+    assert {value for _, _, value in matches} == {"m", "am"}
+
+
+def test_automaton_reports_overlapping_keywords():
+    automaton = KeywordAutomaton([("adresse", 1), ("adresse mail", 2), ("mail", 3), ("il", 4)])
+    assert sorted(value for _, _, value in automaton.find(normalize("Adresse mail ?"))) == [1, 2, 3]
+
+
+@pytest.mark.parametrize(
+    "text, intents, language",
+    [
+        ("Quelle est votre adresse ?", ["address"], "fr"),
+        ("What's your address?", ["address"], "en"),
+        ("Where are you located?", ["address"], "en"),
+        ("Quels sont vos services ?", ["services"], "fr"),
+        ("Êtes-vous ouvert le samedi ?", ["hours"], "fr"),
+        ("Are you open on Sunday?", ["hours"], "en"),
+        ("Hi, what is your email please?", ["email"], "en"),
+        ("Bonjour, votre numéro de téléphone et votre adresse mail svp", ["phone", "email"], "fr"),
+        ("ما هو عنوانكم", ["address"], "ar"),
+    ],
+)
+def test_office_questions_are_detected(text, intents, language):
+    assert detect_intents(text) == (intents, language)
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "Je cherche une location à Paris",
+        "j'ai un problème avec ma location",
+        "Quel est le prix de vos services de syndic ?",
+        "Can I pay my rent by mail?",
+        "I lost my phone, can you resend the lease?",
+        "Mon téléphone ne marche plus, pouvez-vous m'envoyer le bail ?",
+        "Quelle est l'adresse de l'appartement que j'ai visité ?",
+        "What is my email on file?",
+    ],
+)
+def test_other_questions_go_to_the_model(text):
+    assert detect_intents(text) == ([], None)
+    assert fast_path_reply(text) is None
+
+
+def test_shared_keywords_do_not_decide_the_language():
+    # "email" is both French and English; the filler words decide
+    assert detect_intents("email ?")[1] == "fr"
+    assert detect_intents("what is the email")[1] == "en"
+    assert detect_intents("c'est quoi l'email")[1] == "fr"
+
+
+def test_long_messages_go_to_the_model():
+    text = "Bonjour " * 20 + "quelle est votre adresse"
+    assert detect_intents(text) == ([], None)
+
+
+def test_unconfigured_answers_fall_back_to_the_model():
+    assert render_answer(["hours"], "fr", dict(OFFICE_INFO, hours=None)) is None
+    assert render_answer(["services"], "en", {"phone": "+33 1 00 00 00 00"}) is None
+    assert render_answer(["services"], "en", {"services": {"ar": ["إدارة"]}}) is None
+
+
+def test_reply_uses_office_info_and_language():
+    reply = fast_path_reply("What's your phone number?")
+    assert OFFICE_INFO["phone"] in reply
+    assert reply.startswith("📞 You can reach us")
+
+
+def test_fast_path_can_be_disabled():
+    assert fast_path_reply("Quelle est votre adresse ?", office_info=None) is None
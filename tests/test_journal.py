@@ -0,0 +1,153 @@
+import json
+import os
+import time
+
+import pytest
+
+from app.services import journal as journal_module
+from app.services.journal import Journal, JournalError, read_pending, slot_path
+
+
+def _body(message_id):
+    return {"entry": [{"changes": [{"value": {"messages": [{"id": message_id}]}}]}]}
+
+
+def _write_records(path, records, torn_tail=False):
+    with open(path, "w", encoding="utf-8") as fileobj:
+        for record in records:
+            fileobj.write(json.dumps(record) + "\n")
+        if torn_tail:
+            fileobj.write('{"op": "accept", "id": "torn"')
+
+
+def _lines(path):
+    with open(path, "r", encoding="utf-8") as fileobj:
+        return [json.loads(line) for line in fileobj]
+
+
+def _journal(tmp_path, **kwargs):
+    kwargs.setdefault("fsync_interval", 0.001)
+    return Journal(str(tmp_path / "journal.log"), **kwargs)
+
+
+def test_replay_returns_incomplete_messages_and_compacts(tmp_path):
+    path = str(tmp_path / "journal.log")
+    _write_records(
+        path,
+        [
+            {"op": "accept", "id": "a", "body": _body("a")},
+            {"op": "accept", "id": "b", "body": _body("b")},
+            {"op": "done", "id": "a"},
+        ],
+        torn_tail=True,
+    )
+
+    journal = _journal(tmp_path)
+    pending = journal.open()
+
+    assert pending == [_body("b")]
+    assert _lines(path) == [{"op": "accept", "id": "b", "body": _body("b")}]
+    # A redelivery of a message still being replayed is not processed twice
+    assert not journal.accept("b", _body("b"))
+
+
+def test_accept_is_durable_and_deduplicated(tmp_path):
+    journal = _journal(tmp_path)
+    journal.open()
+
+    assert journal.accept("m1", _body("m1"))
+    assert not journal.accept("m1", _body("m1"))
+    assert list(read_pending(journal.path)) == ["m1"]
+
+    journal.complete("m1")
+    time.sleep(0.05)
+    assert list(read_pending(journal.path)) == []
+
+
+def test_forget_lets_a_failed_message_be_redelivered(tmp_path):
+    journal = _journal(tmp_path)
+    journal.open()
+    journal.accept("m1", _body("m1"))
+
+    journal.forget("m1")
+
+    assert journal.accept("m1", _body("m1"))
+    # Still open on disk, so a restart replays it too
+    assert list(read_pending(journal.path)) == ["m1"]
+
+
+def test_failed_sync_fails_accept_and_recovers(tmp_path, monkeypatch):
+    journal = _journal(tmp_path)
+    journal.open()
+    real_fsync = os.fsync
+    disk_failing = True
+
+    def flaky_fsync(fd):
+        if disk_failing:
+            raise OSError(5, "Input/output error")
+        real_fsync(fd)
+
+    monkeypatch.setattr(journal_module.os, "fsync", flaky_fsync)
+
+    with pytest.raises(JournalError):
+        journal.accept("m1", _body("m1"))
+    with pytest.raises(JournalError):
+        journal.accept("m2", _body("m2"))
+    disk_failing = False
+    deadline = time.monotonic() + 2
+    while journal.stats()["error"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert journal.stats()["error"] is None
+    # The redelivery of the failed message is accepted once the journal has recovered
+    assert journal.accept("m1", _body("m1"))
+    assert list(read_pending(journal.path)) == ["m1"]
+
+
+def test_journal_is_compacted_while_running(tmp_path):
+    journal = _journal(tmp_path, compact_records=20)
+    journal.open()
+    for i in range(50):
+        journal.accept(f"m{i}", _body(f"m{i}"))
+        if i != 7:
+            journal.complete(f"m{i}")
+    deadline = time.monotonic() + 2
+    while time.monotonic() < deadline:
+        stats = journal.stats()
+        if stats["compactions"] >= 2 and stats["synced"] == stats["written"]:
+            break
+        time.sleep(0.01)
+
+    assert journal.stats()["compactions"] >= 2
+    assert journal.stats()["pending"] == 1
+    assert list(read_pending(journal.path)) == ["m7"]
+    # 99 records were written; only what came after the last compaction is left
+    assert len(_lines(journal.path)) < 50
+
+
+def test_each_journal_claims_its_own_slot(tmp_path):
+    first = _journal(tmp_path)
+    second = _journal(tmp_path)
+    first.open()
+    second.open()
+
+    assert first.path == slot_path(first.base_path, 0)
+    assert second.path == slot_path(first.base_path, 1)
+    first.accept("m1", _body("m1"))
+    second.accept("m2", _body("m2"))
+    assert list(read_pending(first.path)) == ["m1"]
+    assert list(read_pending(second.path)) == ["m2"]
+
+
+def test_orphaned_slot_is_adopted(tmp_path):
+    base_path = str(tmp_path / "journal.log")
+    orphan = slot_path(base_path, 3)
+    _write_records(orphan, [{"op": "accept", "id": "lost", "body": _body("lost")}])
+    open(f"{orphan}.lock", "a").close()
+
+    journal = _journal(tmp_path)
+    pending = journal.open()
+
+    assert pending == [_body("lost")]
+    assert not os.path.exists(orphan)
+    assert list(read_pending(journal.path)) == ["lost"]
@@ -0,0 +1,206 @@
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.tenants import Tenant, use_tenant
+from app.utils import media_utils, whatsapp_utils
+from app.utils.media_utils import (
+    MEDIA_SPOOL_BYTES,
+    MediaDeadlineExceeded,
+    MediaTooLarge,
+    stream_to_spooled_file,
+)
+
+CHUNK = b"x" * 65536
+
+
+class FakeMediaHandler(BaseHTTPRequestHandler):
+    """
+    Serves /<size> as that many bytes; /chunked/<size> omits Content-Length
+    """
+
+    def do_GET(self):
+        chunked = self.path.startswith("/chunked/")
+        size = int(self.path.rsplit("/", 1)[1])
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        if chunked:
+            self.send_header("Transfer-Encoding", "chunked")
+        else:
+            self.send_header("Content-Length", str(size))
+        self.end_headers()
+        sent = 0
+        try:
+            while sent < size:
+                chunk = CHUNK[: min(len(CHUNK), size - sent)]
+                if chunked:
+                    self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+                else:
+                    self.wfile.write(chunk)
+                sent += len(chunk)
+            if chunked:
+                self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def media_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeMediaHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+@pytest.fixture
+def tenant():
+    with use_tenant(Tenant("test", "123", "token", "secret")) as tenant:
+        yield tenant
+
+
+def test_large_download_stays_under_memory_ceiling(media_server, tenant):
+    size = 16 * 1024 * 1024
+    tracemalloc.start()
+    try:
+        start = time.perf_counter()
+        fileobj, downloaded = stream_to_spooled_file(f"{media_server}/{size}", max_bytes=size)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    with fileobj:
+        assert downloaded == size
+        # Rolled over to disk rather than held in memory
+        assert fileobj._rolled
+        assert fileobj.read(10) == b"x" * 10
+    assert peak < MEDIA_SPOOL_BYTES * 4
+    # Loopback throughput; a regression to per-byte handling would miss this by far
+    assert size / elapsed > 10 * 1024 * 1024
+
+
+def test_concurrent_downloads_complete(media_server, tenant):
+    size = 2 * 1024 * 1024
+    results = []
+
+    def download():
+        with use_tenant(tenant):
+            fileobj, downloaded = stream_to_spooled_file(f"{media_server}/{size}")
+            fileobj.close()
+            results.append(downloaded)
+
+    threads = [threading.Thread(target=download) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [size] * 8
+
+
+def test_declared_size_over_limit_is_rejected(media_server, tenant):
+    with pytest.raises(MediaTooLarge):
+        stream_to_spooled_file(f"{media_server}/{2 * 1024 * 1024}", max_bytes=1024 * 1024)
+
+
+def test_streamed_size_over_limit_is_rejected(media_server, tenant):
+    with pytest.raises(MediaTooLarge):
+        stream_to_spooled_file(f"{media_server}/chunked/{2 * 1024 * 1024}", max_bytes=1024 * 1024)
+
+
+def test_download_past_deadline_is_abandoned(media_server, tenant):
+    with pytest.raises(MediaDeadlineExceeded):
+        stream_to_spooled_file(f"{media_server}/1024", deadline=time.monotonic() - 1)
+
+
+def test_queued_download_gives_up_at_deadline(monkeypatch, media_server, tenant):
+    slots = threading.BoundedSemaphore(1)
+    monkeypatch.setattr(media_utils, "download_slots", slots)
+    slots.acquire()
+    try:
+        start = time.monotonic()
+        with pytest.raises(MediaDeadlineExceeded):
+            stream_to_spooled_file(f"{media_server}/1024", deadline=start + 0.2)
+        assert time.monotonic() - start < 1
+    finally:
+        slots.release()
+    # The abandoned download didn't leak or double-release a slot
+    fileobj, downloaded = stream_to_spooled_file(f"{media_server}/1024")
+    fileobj.close()
+    assert downloaded == 1024
+
+
+def test_mime_type_parameters_are_dropped():
+    assert media_utils.media_mime_type({"mime_type": "audio/ogg; codecs=opus"}) == "audio/ogg"
+    assert media_utils.media_mime_type({}) == ""
+
+
+def test_unsupported_attachment_is_described_without_download(monkeypatch):
+    monkeypatch.setattr(whatsapp_utils, "download_media", pytest.fail)
+    text, file_ids = whatsapp_utils.attach_media("The user sent a image.", {"mime_type": "image/jpeg"})
+    assert file_ids == []
+    assert "image/jpeg" in text
+
+
+def test_voice_note_is_transcribed(monkeypatch):
+    monkeypatch.setattr(whatsapp_utils, "fetch_media", lambda media, deadline: (open(__file__, "rb"), "a.ogg"))
+    monkeypatch.setattr(whatsapp_utils, "transcribe_fileobj", lambda fileobj, filename, deadline: "Bonjour")
+    text, file_ids = whatsapp_utils.attach_media(
+        "The user sent a audio.", {"mime_type": "audio/ogg; codecs=opus"}
+    )
+    assert file_ids == []
+    assert text.endswith("Transcript of the voice message: Bonjour")
+
+
+def test_supported_document_is_uploaded(monkeypatch):
+    monkeypatch.setattr(whatsapp_utils, "forward_media", lambda media, deadline: "file-1")
+    text, file_ids = whatsapp_utils.attach_media("bail.pdf", {"mime_type": "application/pdf"})
+    assert (text, file_ids) == ("bail.pdf", ["file-1"])
+
+
+class FakeTypingIndicator:
+    def __init__(self, tenant, message_id, accepted, typing=True):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def stop(self):
+        pass
+
+
+def test_shed_media_message_is_not_downloaded(monkeypatch, tenant):
+    class Shed:
+        def __enter__(self):
+            raise whatsapp_utils.AdmissionRejected("queue_full")
+
+        def __exit__(self, *exc_info):
+            return False
+
+    sent = []
+    monkeypatch.setattr(
+        whatsapp_utils.admission, "admit", lambda wa_id, tenant, check_sender=True: Shed()
+    )
+    monkeypatch.setattr(whatsapp_utils.admission, "check_sender", lambda wa_id, tenant: None)
+    monkeypatch.setattr(whatsapp_utils, "TypingIndicator", FakeTypingIndicator)
+    monkeypatch.setattr(whatsapp_utils, "attach_media", pytest.fail)
+    monkeypatch.setattr(whatsapp_utils, "send_message", sent.append)
+    body = {"entry": [{"changes": [{"value": {
+        "contacts": [{"wa_id": "33600000000", "profile": {"name": "Test"}}],
+        "messages": [{"id": "wamid.1", "type": "document",
+                      "document": {"id": "m1", "mime_type": "application/pdf"}}],
+    }}]}]}
+
+    whatsapp_utils.reply_to_message(body, tenant, time.monotonic())
+
+    assert len(sent) == 1
+    assert whatsapp_utils.OVERLOAD_REPLY in sent[0]
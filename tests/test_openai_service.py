@@ -0,0 +1,91 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import openai_service
+
+
+def test_client_without_deadline_is_shared():
+    assert openai_service.get_client() is openai_service.client
+
+
+def test_client_timeout_follows_remaining_deadline():
+    bounded = openai_service.get_client(time.monotonic() + 7)
+    assert bounded.timeout == pytest.approx(7, abs=0.5)
+
+
+def test_client_timeout_has_a_floor_past_the_deadline():
+    bounded = openai_service.get_client(time.monotonic() - 3)
+    assert bounded.timeout == openai_service.OPENAI_MIN_CALL_SECONDS
+
+
+def test_deadline_bound_client_does_not_retry():
+    assert openai_service.get_client(time.monotonic() + 7).max_retries == 0
+    assert openai_service.get_client().max_retries > 0
+
+
+class FakeRuns:
+    def __init__(self, run):
+        self.run = run
+
+    def create(self, thread_id, assistant_id):
+        return self.run
+
+    def retrieve(self, thread_id, run_id):
+        return self.run
+
+
+def _fake_client(run, deadlines):
+    fake = SimpleNamespace(
+        beta=SimpleNamespace(
+            assistants=SimpleNamespace(retrieve=lambda assistant_id: SimpleNamespace(id="asst")),
+            threads=SimpleNamespace(runs=FakeRuns(run)),
+        )
+    )
+
+    def get_client(deadline=None):
+        deadlines.append(deadline)
+        return fake
+
+    return get_client
+
+
+def test_failed_run_usage_is_debited(monkeypatch):
+    run = SimpleNamespace(
+        id="run_1", status="failed", last_error="boom", usage=SimpleNamespace(total_tokens=1234)
+    )
+    deadlines = []
+    debited = []
+    monkeypatch.setattr(openai_service, "get_client", _fake_client(run, deadlines))
+    monkeypatch.setattr(openai_service, "record_run_usage", lambda *args: None)
+    monkeypatch.setattr(openai_service.admission, "record_usage", debited.append)
+
+    deadline = time.monotonic() + 10
+    reply = openai_service.run_assistant(SimpleNamespace(id="thread_1"), "Test", "331", deadline)
+
+    assert reply == openai_service.FALLBACK_REPLY
+    assert debited == [1234]
+    # Every OpenAI call was bounded by the reply deadline
+    assert deadlines and all(value == deadline for value in deadlines)
+
+
+def test_run_is_cancelled_when_polling_fails(monkeypatch):
+    run = SimpleNamespace(id="run_1", status="in_progress")
+    cancelled = []
+
+    def failing_retrieve(self, thread_id, run_id):
+        raise TimeoutError("read timed out")
+
+    monkeypatch.setattr(openai_service, "get_client", _fake_client(run, []))
+    monkeypatch.setattr(FakeRuns, "retrieve", failing_retrieve)
+    monkeypatch.setattr(
+        openai_service,
+        "cancel_run",
+        lambda thread_id, run, reason: cancelled.append((thread_id, run.id, reason)),
+    )
+
+    reply = openai_service.run_assistant(SimpleNamespace(id="thread_1"), "Test", "331", time.monotonic() + 10)
+
+    assert reply == "Sorry, I couldn't process your request at the moment."
+    assert cancelled == [("thread_1", "run_1", "error")]
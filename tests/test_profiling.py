@@ -0,0 +1,59 @@
+import threading
+import time
+from collections import Counter
+
+import pytest
+
+from app import create_app
+from app.utils.profiling import format_collapsed, sample_stacks
+
+
+@pytest.fixture(scope="module")
+def client():
+    return create_app().test_client()
+
+
+def test_zero_interval_does_not_busy_loop():
+    stop = threading.Event()
+    worker = threading.Thread(target=stop.wait, name="sleeper")
+    worker.start()
+    try:
+        stacks = sample_stacks(0.05, interval=0)
+    finally:
+        stop.set()
+        worker.join()
+    # At most one sample per millisecond per thread
+    assert 0 < sum(count for stack, count in stacks.items() if stack.startswith("sleeper;")) <= 60
+
+
+def test_format_collapsed_orders_by_count():
+    stacks = Counter({"main;a": 1, "main;b": 3})
+    assert format_collapsed(stacks) == "main;b 3\nmain;a 1\n"
+
+
+def test_huge_interval_ends_with_the_profile():
+    start = time.monotonic()
+    sample_stacks(0.05, interval=1e6)
+    assert time.monotonic() - start < 1
+
+
+@pytest.mark.parametrize("interval_ms", ["0", "-5", "nan", "inf"])
+def test_profile_endpoint_rejects_bad_intervals(client, interval_ms):
+    response = client.get(
+        f"/admin/profile?seconds=0.01&interval_ms={interval_ms}",
+        headers={"Authorization": "Bearer test-admin-token"},
+    )
+    assert response.status_code == 400
+
+
+def test_profile_endpoint_returns_collapsed_stacks(client):
+    response = client.get(
+        "/admin/profile?seconds=0.05&interval_ms=5",
+        headers={"Authorization": "Bearer test-admin-token"},
+    )
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+
+
+def test_profile_endpoint_requires_admin_token(client):
+    assert client.get("/admin/profile?seconds=0.01").status_code in (401, 403)
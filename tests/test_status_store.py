@@ -0,0 +1,91 @@
+import time
+
+import pytest
+
+from app.services import status_store
+from app.utils.sqlite_store import SQLiteStore
+
+
+@pytest.fixture
+def store(monkeypatch, tmp_path):
+    store = SQLiteStore(str(tmp_path / "statuses.db"), status_store.SCHEMA)
+    monkeypatch.setattr(status_store, "store", store)
+    return store
+
+
+def _status(message_id, status, ts, errors=None):
+    status = {"id": message_id, "status": status, "timestamp": str(ts), "recipient_id": "331"}
+    if errors is not None:
+        status["errors"] = errors
+    return status
+
+
+def _body(*statuses):
+    return {"entry": [{"changes": [{"value": {"statuses": list(statuses)}}]}]}
+
+
+def test_parse_statuses_reads_every_change():
+    body = {
+        "entry": [
+            {"changes": [{"value": {"statuses": [_status("m1", "sent", 100)]}}]},
+            {"changes": [{"value": {"messages": [{}]}}, {"value": {"statuses": [_status("m2", "read", 101)]}}]},
+        ]
+    }
+    assert status_store.parse_statuses(body) == [
+        ("m1", "sent", 100, "331", None, None),
+        ("m2", "read", 101, "331", None, None),
+    ]
+
+
+def test_parse_statuses_keeps_the_first_of_several_errors():
+    errors = [{"code": 131047, "title": "Re-engagement message"}, {"code": 131026, "title": "Undeliverable"}]
+    events = status_store.parse_statuses(_body(_status("m1", "failed", 100, errors)))
+    assert events == [("m1", "failed", 100, "331", 131047, "Re-engagement message")]
+
+
+def test_duplicate_statuses_are_ignored(store):
+    events = status_store.parse_statuses(_body(_status("m1", "sent", 100), _status("m1", "delivered", 101)))
+    status_store.write_statuses(events)
+    # Webhook redelivery, with a later timestamp for the same status
+    status_store.write_statuses(status_store.parse_statuses(_body(_status("m1", "sent", 150))))
+
+    rows = store.connection().execute(
+        "SELECT status, ts FROM message_statuses WHERE message_id = 'm1' ORDER BY ts"
+    ).fetchall()
+    assert rows == [("sent", 100), ("delivered", 101)]
+
+
+def test_status_report_percentiles_and_failures(store):
+    base = int(time.time()) - 1000
+    statuses = []
+    for i in range(10):
+        statuses.append(_status(f"m{i}", "sent", base))
+        statuses.append(_status(f"m{i}", "delivered", base + i + 1))
+        if i < 4:
+            statuses.append(_status(f"m{i}", "read", base + i + 11))
+    statuses.append(_status("f1", "failed", base, [{"code": 131047, "title": "Re-engagement message"}]))
+    statuses.append(_status("f2", "failed", base, [{"code": 131047, "title": "Re-engagement message"}]))
+    statuses.append(_status("f3", "failed", base, [{"code": 131026, "title": "Undeliverable"}]))
+    # Outside the window
+    statuses.append(_status("old", "sent", base - 100000))
+    statuses.append(_status("old", "failed", base - 100000, [{"code": 131026, "title": "Undeliverable"}]))
+    status_store.write_statuses(status_store.parse_statuses(_body(*statuses)))
+
+    report = status_store.status_report(since_seconds=86400)
+
+    assert report["messages"] == 10
+    latency = report["latency_seconds"]
+    assert latency["sent_to_delivered"] == {"p50": 6, "p90": 10, "p95": 10, "p99": 10}
+    assert latency["delivered_to_read"] == {"p50": 10, "p90": 10, "p95": 10, "p99": 10}
+    assert latency["sent_to_read"] == {"p50": 13, "p90": 14, "p95": 14, "p99": 14}
+    assert report["failures"] == [
+        {"error_code": 131047, "title": "Re-engagement message", "count": 2},
+        {"error_code": 131026, "title": "Undeliverable", "count": 1},
+    ]
+
+
+def test_status_report_on_empty_window(store):
+    report = status_store.status_report()
+    assert report["messages"] == 0
+    assert report["latency_seconds"]["sent_to_read"] == {}
+    assert report["failures"] == []
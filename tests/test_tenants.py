@@ -0,0 +1,123 @@
+import json
+import os
+
+import pytest
+
+from app import create_app, tenants
+from app.tenants import TenantConfigError, load_tenants
+
+
+@pytest.fixture(autouse=True)
+def restore_tenants():
+    saved = dict(tenants.tenants_by_phone_number_id), tenants.default_tenant
+    yield
+    tenants.tenants_by_phone_number_id.clear()
+    tenants.tenants_by_phone_number_id.update(saved[0])
+    tenants.default_tenant = saved[1]
+
+
+def _config(tmp_path, entries, **overrides):
+    path = tmp_path / "tenants.json"
+    path.write_text(json.dumps({"tenants": entries}), encoding="utf-8")
+    config = {"TENANTS_FILE": str(path)}
+    config.update(overrides)
+    return config
+
+
+def _entry(**overrides):
+    entry = {
+        "name": "brand_a",
+        "phone_number_id": "1001",
+        "access_token": "$BRAND_A_TOKEN",
+        "app_secret": "$BRAND_A_SECRET",
+    }
+    entry.update(overrides)
+    return entry
+
+
+@pytest.fixture
+def brand_env(monkeypatch):
+    monkeypatch.setenv("BRAND_A_TOKEN", "token-a")
+    monkeypatch.setenv("BRAND_A_SECRET", "secret-a")
+
+
+def test_tenants_file_is_loaded_with_expanded_variables(tmp_path, brand_env):
+    load_tenants(_config(tmp_path, [_entry()]))
+    tenant = tenants.tenants_by_phone_number_id["1001"]
+    assert (tenant.access_token, tenant.app_secret) == ("token-a", "secret-a")
+
+
+@pytest.mark.parametrize("value", ["$BRAND_A_MISSING", "${BRAND_A_MISSING}", "prefix-$BRAND_A_MISSING"])
+def test_unset_variable_fails_startup(tmp_path, brand_env, monkeypatch, value):
+    monkeypatch.delenv("BRAND_A_MISSING", raising=False)
+    with pytest.raises(TenantConfigError, match="BRAND_A_MISSING"):
+        load_tenants(_config(tmp_path, [_entry(access_token=value)]))
+
+
+@pytest.mark.parametrize("field", ["access_token", "app_secret", "phone_number_id"])
+def test_empty_credential_fails_startup(tmp_path, brand_env, field):
+    with pytest.raises(TenantConfigError, match=field):
+        load_tenants(_config(tmp_path, [_entry(**{field: ""})]))
+
+
+@pytest.mark.parametrize(
+    "office_info",
+    [
+        "4 Rue Berzélius",
+        {"adress": "4 Rue Berzélius"},
+        {"phone": 33142636363},
+        {"services": ["Gestion locative"]},
+        {"services": {"fr": "Gestion locative"}},
+    ],
+)
+def test_malformed_office_info_fails_startup(tmp_path, brand_env, office_info):
+    with pytest.raises(TenantConfigError, match="office_info"):
+        load_tenants(_config(tmp_path, [_entry(office_info=office_info)]))
+
+
+def test_example_tenants_file_loads(brand_env, monkeypatch):
+    for name in ("PHONE_NUMBER_ID", "ACCESS_TOKEN", "APP_SECRET", "VERIFY_TOKEN", "ASSISTANT_ID"):
+        monkeypatch.setenv(f"FRANCILIEN_{name}", name.lower())
+    example = os.path.join(os.path.dirname(__file__), os.pardir, "tenants.example.json")
+    load_tenants({"TENANTS_FILE": example})
+    assert tenants.tenants_by_phone_number_id["phone_number_id"].office_info["phone"]
+
+
+def test_default_tenant_needs_credentials_when_routable():
+    with pytest.raises(TenantConfigError, match="app_secret"):
+        load_tenants({"PHONE_NUMBER_ID": "2002", "ACCESS_TOKEN": "token"})
+
+
+def test_concurrency_default_is_read_when_loading(tmp_path, brand_env, monkeypatch):
+    monkeypatch.setenv("TENANT_MAX_CONCURRENT_RUNS", "7")
+    load_tenants(_config(tmp_path, [_entry(), _entry(name="brand_b", phone_number_id="1002", max_concurrency=2)]))
+    assert tenants.default_tenant.max_concurrency == 7
+    assert tenants.tenants_by_phone_number_id["1001"].max_concurrency == 7
+    assert tenants.tenants_by_phone_number_id["1002"].max_concurrency == 2
+
+
+def test_body_is_routed_by_phone_number_id(tmp_path, brand_env):
+    load_tenants(_config(tmp_path, [_entry()]))
+    body = {"entry": [{"changes": [{"value": {"metadata": {"phone_number_id": "1001"}}}]}]}
+    assert tenants.tenant_for_body(body).name == "brand_a"
+    # The default tenant has no number configured, so nothing falls back to it
+    assert tenants.tenant_for_body({}) is None
+    body["entry"][0]["changes"][0]["value"]["metadata"]["phone_number_id"] = "9999"
+    assert tenants.tenant_for_body(body) is None
+
+
+def test_unknown_numbers_fall_back_to_a_configured_default(tmp_path, brand_env):
+    load_tenants(_config(tmp_path, [_entry()], PHONE_NUMBER_ID="2002", ACCESS_TOKEN="t", APP_SECRET="s"))
+    body = {"entry": [{"changes": [{"value": {"metadata": {"phone_number_id": "9999"}}}]}]}
+    assert tenants.tenant_for_body(body) is tenants.default_tenant
+    assert tenants.tenant_for_body({}) is tenants.default_tenant
+
+
+def test_webhook_for_unknown_number_is_rejected(tmp_path, brand_env):
+    app = create_app()
+    load_tenants(_config(tmp_path, [_entry()]))
+    body = {"entry": [{"changes": [{"value": {"metadata": {"phone_number_id": "9999"}}}]}]}
+    response = app.test_client().post(
+        "/webhook", json=body, headers={"X-Hub-Signature-256": "sha256=x"}
+    )
+    assert response.status_code == 403
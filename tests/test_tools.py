@@ -0,0 +1,126 @@
+import json
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import property_tools, tools
+from app.services.tools import Tool, execute_tool_calls
+
+
+def _tool(handler, timeout=1, cache_ttl=0):
+    return Tool(handler, handler.__name__, "Test tool.", timeout, cache_ttl)
+
+
+def _call(call_id, name, **arguments):
+    return SimpleNamespace(
+        id=call_id, function=SimpleNamespace(name=name, arguments=json.dumps(arguments))
+    )
+
+
+def lookup(reference: str, limit: int = 5, wa_id=None):
+    return {"reference": reference, "limit": limit, "wa_id": wa_id}
+
+
+def test_definition_hides_context_parameters():
+    definition = _tool(lookup).definition()["function"]["parameters"]
+    assert definition["properties"] == {"reference": {"type": "string"}, "limit": {"type": "integer"}}
+    assert definition["required"] == ["reference"]
+
+
+def test_bind_coerces_types_and_injects_context():
+    kwargs = _tool(lookup).bind({"reference": "A1", "limit": "3"}, {"wa_id": "331"})
+    assert kwargs == {"reference": "A1", "limit": 3, "wa_id": "331"}
+
+
+@pytest.mark.parametrize(
+    "arguments",
+    [
+        {},
+        {"reference": "A1", "unknown": 1},
+        {"reference": "A1", "limit": "many"},
+        {"reference": "A1", "wa_id": "33699999999"},
+        ["A1"],
+    ],
+)
+def test_bind_rejects_bad_arguments(arguments):
+    with pytest.raises(TypeError):
+        _tool(lookup).bind(arguments, {"wa_id": "331"})
+
+
+def test_calls_run_concurrently(monkeypatch):
+    def slow(reference: str):
+        time.sleep(0.2)
+        return reference
+
+    monkeypatch.setitem(tools.registry, "slow", Tool(slow, "slow", "", 1, 0))
+    start = time.monotonic()
+    outputs = execute_tool_calls([_call(f"c{i}", "slow", reference=str(i)) for i in range(4)])
+    assert time.monotonic() - start < 0.6
+    assert [output["output"] for output in outputs] == ['"0"', '"1"', '"2"', '"3"']
+
+
+def test_timeouts_and_unknown_tools_return_errors(monkeypatch):
+    def stuck(reference: str):
+        time.sleep(0.5)
+
+    monkeypatch.setitem(tools.registry, "stuck", Tool(stuck, "stuck", "", 0.05, 0))
+    outputs = execute_tool_calls([_call("a", "stuck", reference="x"), _call("b", "missing")])
+    assert json.loads(outputs[0]["output"]) == {"error": "The lookup timed out"}
+    assert "Unknown tool" in json.loads(outputs[1]["output"])["error"]
+
+
+def test_cache_is_per_sender(monkeypatch):
+    calls = []
+
+    def whoami(wa_id=None):
+        calls.append(wa_id)
+        return wa_id
+
+    monkeypatch.setitem(tools.registry, "whoami", Tool(whoami, "whoami", "", 1, 60))
+    first = execute_tool_calls([_call("a", "whoami")], wa_id="331")
+    second = execute_tool_calls([_call("b", "whoami")], wa_id="332")
+    again = execute_tool_calls([_call("c", "whoami")], wa_id="331")
+
+    assert calls == ["331", "332"]
+    assert [first[0]["output"], second[0]["output"], again[0]["output"]] == ['"331"', '"332"', '"331"']
+
+
+@pytest.fixture
+def property_data(monkeypatch):
+    path = "data/properties.example.json"
+    monkeypatch.setattr(property_tools, "PROPERTY_DATA_PATH", path)
+
+
+def test_lease_is_only_visible_to_its_tenant(property_data):
+    assert property_tools.get_rent_balance("BAIL-2024-017", wa_id="+33612345678")["found"]
+    assert property_tools.get_rent_balance("BAIL-2024-017", wa_id="33699999999") == {"found": False}
+    assert property_tools.get_rent_balance("BAIL-2024-017", wa_id=None) == {"found": False}
+
+
+def test_quote_is_only_visible_to_its_requester(property_data):
+    assert property_tools.get_syndic_quote_status("DEVIS-0093", wa_id="33611122233")["found"]
+    assert property_tools.get_syndic_quote_status("DEVIS-0093", wa_id="33612345678") == {"found": False}
+
+
+def test_listed_property_slots_are_public(property_data, monkeypatch):
+    assert property_tools.get_viewing_slots("APT-17-042", limit=2, wa_id="33600000000") == {
+        "found": True,
+        "slots": ["2024-06-20T10:00", "2024-06-20T11:00"],
+    }
+    data = property_tools.load_property_data()
+    monkeypatch.setitem(data["properties"]["APT-17-042"], "listed", False)
+    assert property_tools.get_viewing_slots("APT-17-042", wa_id="33600000000") == {"found": False}
+    assert property_tools.get_viewing_slots("APT-17-042", wa_id="33698765432")["found"]
+
+
+def test_model_cannot_choose_whose_lease_it_reads(property_data):
+    outputs = execute_tool_calls(
+        [_call("a", "get_rent_balance", lease_reference="BAIL-2024-017", wa_id="33612345678")],
+        wa_id="33699999999",
+    )
+    assert "Invalid arguments" in json.loads(outputs[0]["output"])["error"]
+    outputs = execute_tool_calls(
+        [_call("b", "get_rent_balance", lease_reference="BAIL-2024-017")], wa_id="33699999999"
+    )
+    assert json.loads(outputs[0]["output"]) == {"found": False}
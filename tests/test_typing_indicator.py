@@ -0,0 +1,136 @@
+import json
+import time
+
+import pytest
+
+from app.services.admission import AdmissionRejected
+from app.tenants import Tenant
+from app.utils import typing_indicator, whatsapp_utils
+from app.utils.typing_indicator import TypingRefresher, get_read_typing_input
+
+
+class RecordingIndicator:
+    events = []
+    typing = []
+
+    def __init__(self, tenant, message_id, accepted, typing=True):
+        self.message_id = message_id
+        self.typing.append(typing)
+
+    def __enter__(self):
+        self.events.append(("start", self.message_id))
+        return self
+
+    def __exit__(self, *exc_info):
+        self.events.append(("exit", self.message_id))
+        return False
+
+    def stop(self):
+        self.events.append(("stop", self.message_id))
+
+
+@pytest.fixture
+def indicator(monkeypatch):
+    RecordingIndicator.events = []
+    RecordingIndicator.typing = []
+    monkeypatch.setattr(whatsapp_utils, "TypingIndicator", RecordingIndicator)
+    monkeypatch.setattr(whatsapp_utils.journal, "complete", lambda message_id: None)
+    return RecordingIndicator.events
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    def send_message(data):
+        RecordingIndicator.events.append(("send", json.loads(data)["text"]["body"]))
+
+    monkeypatch.setattr(whatsapp_utils, "send_message", send_message)
+
+
+def _body(message):
+    return {"entry": [{"changes": [{"value": {
+        "contacts": [{"wa_id": "33600000001", "profile": {"name": "Test"}}],
+        "messages": [dict({"id": "wamid.1"}, **message)],
+    }}]}]}
+
+
+TENANT = Tenant("default", "123", "token", "secret")
+
+
+def test_unsupported_message_shows_no_indicator(indicator, sent):
+    whatsapp_utils.reply_to_message(_body({"type": "reaction", "reaction": {}}), TENANT, time.monotonic())
+    assert indicator == []
+
+
+def _reject_sender(monkeypatch, notify):
+    def check_sender(wa_id, tenant):
+        raise AdmissionRejected("sender_rate", notify)
+
+    monkeypatch.setattr(whatsapp_utils.admission, "check_sender", check_sender)
+
+
+def test_rate_limited_sender_is_told_to_slow_down(indicator, sent, monkeypatch):
+    _reject_sender(monkeypatch, notify=True)
+    body = _body({"type": "text", "text": {"body": "Pouvez-vous m'envoyer mon bail ?"}})
+    whatsapp_utils.reply_to_message(body, TENANT, time.monotonic())
+    assert ("send", whatsapp_utils.SENDER_RATE_REPLY) in indicator
+
+
+def test_flooding_sender_is_not_marked_as_read(indicator, sent, monkeypatch):
+    _reject_sender(monkeypatch, notify=False)
+    body = _body({"type": "text", "text": {"body": "Pouvez-vous m'envoyer mon bail ?"}})
+    whatsapp_utils.reply_to_message(body, TENANT, time.monotonic())
+    assert indicator == []
+
+
+def test_indicator_stops_before_the_reply_is_sent(indicator, sent):
+    body = _body({"type": "text", "text": {"body": "Quelle est votre adresse ?"}})
+    whatsapp_utils.reply_to_message(body, TENANT, time.monotonic())
+    assert [event for event, _ in indicator] == ["start", "stop", "send", "exit"]
+    # Answered on the fast path, so there is nothing to show "typing" for
+    assert RecordingIndicator.typing == [False]
+
+
+def test_model_reply_shows_typing(indicator, sent, monkeypatch):
+    monkeypatch.setattr(whatsapp_utils, "generate_response", lambda *args, **kwargs: "Voici votre bail.")
+    monkeypatch.setattr(whatsapp_utils, "record_model_latency", lambda seconds: None)
+    body = _body({"type": "text", "text": {"body": "Pouvez-vous m'envoyer mon bail ?"}})
+    whatsapp_utils.reply_to_message(body, TENANT, time.monotonic())
+    assert ("send", "Voici votre bail.") in indicator
+    assert RecordingIndicator.typing == [True]
+
+
+def test_read_typing_payload():
+    payload = json.loads(get_read_typing_input("wamid.1"))
+    assert payload["status"] == "read"
+    assert payload["message_id"] == "wamid.1"
+    assert payload["typing_indicator"] == {"type": "text"}
+    assert "typing_indicator" not in json.loads(get_read_typing_input("wamid.1", typing=False))
+
+
+def test_first_send_after_stop_only_marks_read(monkeypatch):
+    sends = []
+    monkeypatch.setattr(
+        typing_indicator,
+        "send_read_and_typing",
+        lambda tenant, message_id, typing=True: sends.append(typing),
+    )
+    indicator = typing_indicator.TypingIndicator(TENANT, "wamid.3", time.monotonic())
+    indicator.stop()
+    indicator._first_send()
+    assert sends == [False]
+
+
+def test_refresher_resends_until_removed(monkeypatch):
+    sends = []
+    monkeypatch.setattr(
+        typing_indicator, "send_read_and_typing", lambda tenant, message_id: sends.append(message_id)
+    )
+    refresher = TypingRefresher(interval=0.05)
+    refresher.add(TENANT, "wamid.2")
+    time.sleep(0.18)
+    refresher.remove("wamid.2")
+    count = len(sends)
+    time.sleep(0.12)
+
+    assert count >= 2
+    assert len(sends) == count
@@ -0,0 +1,87 @@
+import time
+
+import pytest
+
+from app.services import usage_store
+from app.utils.sqlite_store import SQLiteStore
+
+
+@pytest.fixture
+def store(monkeypatch, tmp_path):
+    store = SQLiteStore(str(tmp_path / "usage.db"), usage_store.SCHEMA)
+    monkeypatch.setattr(usage_store, "store", store)
+    return store
+
+
+def _run(ts, wa_id, thread_id, model="gpt-4o", status="completed", prompt=1000, completion=100, wall=2.0):
+    return (ts, wa_id, thread_id, f"run-{thread_id}-{ts}", model, status, prompt, completion, wall)
+
+
+def test_estimate_cost():
+    assert usage_store.estimate_cost("gpt-4o", 1_000_000, 100_000) == pytest.approx(3.5)
+    assert usage_store.estimate_cost("some-new-model", 1000, 100) is None
+
+
+def test_per_reply_averages_only_count_completed_runs(store):
+    now = time.time()
+    usage_store.write_usage([
+        _run(now - 30, "331", "t1", prompt=1000, completion=100, wall=2.0),
+        _run(now - 20, "331", "t1", prompt=3000, completion=300, wall=4.0),
+        _run(now - 10, "331", "t1", status="expired", prompt=9000, completion=0, wall=60.0),
+    ])
+
+    report = usage_store.usage_report()
+
+    assert report["per_reply"] == [
+        {
+            "model": "gpt-4o",
+            "replies": 2,
+            "prompt_tokens_per_reply": 2000,
+            "completion_tokens_per_reply": 200,
+            "cost_usd_per_reply": pytest.approx(0.007),
+            "avg_wall_seconds": 3.0,
+        }
+    ]
+
+
+def test_unknown_model_is_reported_without_a_cost(store):
+    now = time.time()
+    usage_store.write_usage([
+        _run(now - 10, "331", "t1", model="some-new-model"),
+        _run(now - 10, "332", "t2", prompt=500, completion=50),
+    ])
+
+    report = usage_store.usage_report()
+
+    top = {row["wa_id"]: row for row in report["top_consumers"]}
+    assert [row["wa_id"] for row in report["top_consumers"]] == ["331", "332"]
+    assert top["331"]["cost_usd"] is None
+    assert top["332"]["cost_usd"] == pytest.approx(0.00175)
+    per_reply = {row["model"]: row for row in report["per_reply"]}
+    assert per_reply["some-new-model"]["cost_usd_per_reply"] is None
+
+
+def test_latency_by_thread_length_counts_turns_over_the_whole_thread(store):
+    now = time.time()
+    old = now - 10 * 86400
+    records = [
+        # Thread t1: two turns before the window, so its runs in the window are turns 3-7
+        _run(old, "331", "t1", wall=1.0),
+        _run(old + 1, "331", "t1", wall=1.0),
+    ]
+    records += [_run(now - 100 + turn, "331", "t1", prompt=5000, wall=6.0 + turn) for turn in range(5)]
+    # Thread t2: one turn, then a long thread t3 crossing into 21+
+    records.append(_run(now - 50, "332", "t2", prompt=800, wall=1.5))
+    records += [_run(now - 90 + turn, "333", "t3", prompt=20000, wall=10.0) for turn in range(22)]
+    usage_store.write_usage(records)
+
+    report = usage_store.usage_report()
+
+    buckets = {row["turns"]: row for row in report["by_thread_length"]}
+    assert [row["turns"] for row in report["by_thread_length"]] == ["1", "2-5", "6-20", "21+"]
+    assert buckets["1"]["runs"] == 2  # t2 and t3's first run; t1's first turn is outside the window
+    assert buckets["2-5"]["runs"] == 3 + 4  # t1 turns 3-5, t3 turns 2-5
+    assert buckets["6-20"]["runs"] == 2 + 15  # t1 turns 6-7, t3 turns 6-20
+    assert buckets["21+"]["runs"] == 2
+    assert buckets["21+"]["avg_prompt_tokens"] == 20000
+    assert buckets["1"]["max_wall_seconds"] == 10.0